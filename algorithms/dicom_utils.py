@@ -0,0 +1,141 @@
+import os
+import numpy as np
+import pydicom
+from pydicom.pixels import iter_pixels
+
+
+def iter_dicom_files(input_dir, index_path=None):
+    """
+    Percorre o diretório de entrada e retorna (subdiretório, arquivo) para cada DICOM.
+    Com index_path, os arquivos são consultados no índice (build-index) em vez do disco.
+    """
+    if index_path:
+        from dicom_index import iter_indexed_files
+
+        yield from iter_indexed_files(input_dir, index_path)
+        return
+
+    for subdir, _, files in os.walk(input_dir):
+        for file in files:
+            if file.lower().endswith(".dcm"):
+                yield subdir, file
+
+
+def result_file_name(subdir, file, frame=None):
+    """
+    Nome usado para identificar a imagem original no CSV de resultados (com o
+    sufixo '#f0001' para um quadro de um objeto multiframe).
+    """
+    name = f"{subdir.split('/')[-1]}/{file}"
+    if frame is None:
+        return name
+    return f"{name}#f{frame + 1:04d}"
+
+
+def frame_file_name(file, frame, extension):
+    """Nome da saída: '<arquivo><extensão>', ou '<arquivo>_f0001<extensão>' por quadro."""
+    stem = os.path.splitext(file)[0]
+    if frame is None:
+        return stem + extension
+    return f"{stem}_f{frame + 1:04d}{extension}"
+
+
+def iter_dicom_frames(file_path):
+    """
+    Percorre os quadros de um DICOM, retornando (quadro, número de quadros, pixels).
+    Objetos multiframe são decodificados um quadro por vez (iter_pixels), sem
+    carregar o volume inteiro; nos demais o quadro é None.
+    """
+    # O PixelData só é lido do disco quando acessado (defer_size)
+    dataset = pydicom.dcmread(file_path, force=True, defer_size="1 KB")
+    n_frames = int(dataset.get("NumberOfFrames") or 1)
+    if n_frames == 1:
+        yield None, 1, dataset.pixel_array
+        return
+
+    for frame, pixel_array in enumerate(iter_pixels(file_path)):
+        yield frame, n_frames, pixel_array
+
+
+def iter_dicom_images(file_paths):
+    """Quadros de uma lista de DICOMs, lidos um a um e normalizados para 0-255."""
+    for file_path in file_paths:
+        for _, _, pixel_array in iter_dicom_frames(file_path):
+            yield normalize_pixel_array(pixel_array)
+
+
+def normalize_pixel_array(pixel_array):
+    """Normaliza os valores dos pixels para o intervalo 0-255 (uint8)."""
+    pixel_array = (pixel_array - np.min(pixel_array)) / (
+        np.max(pixel_array) - np.min(pixel_array)
+    )
+    return (pixel_array * 255).astype(np.uint8)
+
+
+def calculate_compression_rate(original_size, converted_size):
+    """Taxa de compressão (%) em relação ao arquivo DICOM original."""
+    return (1 - converted_size / original_size) * 100
+
+
+def write_summary(original_sizes, converted_sizes, compression_rates, output_txt_path):
+    """
+    Calcula as estatísticas da conversão, exibe e salva em um arquivo txt (apenas
+    exibe se output_txt_path for None).
+    """
+    # Calcula estatísticas
+    mean_original_size = np.mean(original_sizes)
+    mean_converted_size = np.mean(converted_sizes)
+    mean_compression_rate = np.mean(compression_rates)
+    std_dev_compression_rate = np.std(compression_rates)
+
+    # Exibe os resultados
+    summary = (
+        f"\nTotal de arquivos convertidos: {len(original_sizes)}\n"
+        f"Tamanho médio do arquivo original: {mean_original_size / 1024:.2f} KB\n"
+        f"Tamanho médio do arquivo comprimido: {mean_converted_size / 1024:.2f} KB\n"
+        f"Taxa de compressão média: {mean_compression_rate:.2f}%\n"
+        f"Desvio padrão da taxa de compressão: {std_dev_compression_rate:.2f}"
+    )
+    print(summary)
+
+    # Salva os resultados em um arquivo txt
+    if output_txt_path is not None:
+        with open(output_txt_path, "w") as txt_file:
+            txt_file.write(summary)
+
+
+def summarize_results(results, output_txt_path):
+    """Agrega os resultados por arquivo (tamanhos e taxas) e salva o resumo."""
+    write_summary(
+        [result["original_size"] for result in results],
+        [result["converted_size"] for result in results],
+        [result["compression_rate"] for result in results],
+        output_txt_path,
+    )
+
+
+def add_index_argument(parser):
+    """Adiciona a opção --index (índice SQLite gerado por build-index) a um ArgumentParser."""
+    parser.add_argument(
+        "--index",
+        type=str,
+        default=None,
+        help="Índice SQLite (build-index) consultado no lugar de percorrer o diretório",
+    )
+
+
+def add_metrics_argument(
+    parser,
+    help="Decodifica cada saída em memória e registra MSE e PSNR junto à taxa de compressão",
+):
+    """Adiciona a opção --metrics (MSE e PSNR de cada saída) a um ArgumentParser."""
+    parser.add_argument("--metrics", action="store_true", help=help)
+
+
+def add_dry_run_argument(parser):
+    """Adiciona a opção --dry-run (apenas mede os tamanhos) a um ArgumentParser."""
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Codifica em memória e registra tamanhos e taxas sem gravar as saídas, o resumo txt nem o manifesto",
+    )
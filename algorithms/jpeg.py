@@ -1,101 +1,300 @@
+import io
 import os
-import pydicom
+import argparse
+from functools import partial
 from PIL import Image
 import numpy as np
-from write_result_csv import update_compression_csv
+from dicom_utils import (
+    add_dry_run_argument,
+    add_index_argument,
+    add_metrics_argument,
+    calculate_compression_rate,
+    frame_file_name,
+    iter_dicom_frames,
+    normalize_pixel_array,
+    result_file_name,
+    summarize_results,
+)
+from manifest import Manifest, add_manifest_arguments, run_with_manifest
+from metrics import calculate_metrics
+from parallel import add_workers_argument
+from timing import StageTimer, add_timing_argument, start_timing_log, summarize_timings
+from write_result_csv import ResultsWriter, compact_results
 
 
-def convert_dicom_to_jpeg(input_dir):
-    # Cria o diretório de saída com sufixo '-jpeg-compressed'
-    output_dir = input_dir + "-jpeg-compressed"
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
+def encode_jpeg(pixel_array, quality=None):
+    """Codifica uma matriz uint8 como JPEG (qualidade padrão do Pillow) e retorna os bytes."""
+    # Converte a matriz de pixels em uma imagem Pillow
+    image = Image.fromarray(pixel_array)
 
-    # Listas para armazenar tamanhos dos arquivos
-    original_sizes = []
-    converted_sizes = []
-    compression_rates = []
+    buffer = io.BytesIO()
+    if quality is None:
+        image.save(buffer, format="JPEG")
+    else:
+        image.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
 
-    # Percorre todos os arquivos no diretório de entrada
-    for subdir, _, files in os.walk(input_dir):
-        for file in files:
-            if file.lower().endswith(".dcm"):
-                dicom_path = os.path.join(subdir, file)
 
-                try:
-                    # Carrega o arquivo DICOM
-                    dicom = pydicom.dcmread(dicom_path, force=True)
+def decode_jpeg(data):
+    """Decodifica os bytes de um JPEG em uma matriz uint8 em escala de cinza."""
+    return np.array(Image.open(io.BytesIO(data)).convert("L"), dtype=np.uint8)
 
-                    # Extrai os dados de pixel da imagem DICOM
-                    pixel_array = dicom.pixel_array
 
-                    # Normaliza os valores dos pixels para o intervalo 0-255
-                    pixel_array = (pixel_array - np.min(pixel_array)) / (
-                        np.max(pixel_array) - np.min(pixel_array)
-                    )
-                    pixel_array = (pixel_array * 255).astype(np.uint8)
+def encode_jpeg_target(pixel_array, target_psnr=None, max_mse=None):
+    """
+    Busca binária da menor qualidade (1-100) cujo JPEG atinge target_psnr (ou não
+    passa de max_mse), com todas as tentativas codificadas em memória. Retorna
+    (bytes, qualidade, métricas); se nem a qualidade 100 atinge o alvo, usa 100.
+    """
+
+    def meets_target(metrics):
+        if max_mse is not None:
+            return metrics["mse"] <= max_mse
+        return metrics["psnr"] >= target_psnr
+
+    best = None
+    low, high = 1, 100
+    while low <= high:
+        quality = (low + high) // 2
+        data = encode_jpeg(pixel_array, quality)
+        metrics = calculate_metrics(pixel_array, decode_jpeg(data))
+        if meets_target(metrics):
+            best = (data, quality, metrics)
+            high = quality - 1
+        else:
+            # A busca só chega à qualidade 100 se nenhuma menor atinge o alvo
+            if quality == 100:
+                fallback = (data, quality, metrics)
+            low = quality + 1
+
+    return best if best is not None else fallback
+
+
+def jpeg_variant(target_psnr=None, max_mse=None):
+    """Método, sufixo do diretório de saída e parâmetros do manifesto do JPEG."""
+    if target_psnr is not None:
+        return (
+            f"JPEG-PSNR{target_psnr:g}",
+            f"-jpeg-psnr-compressed-{target_psnr:g}",
+            {"target_psnr": target_psnr},
+        )
+    if max_mse is not None:
+        return (
+            f"JPEG-MSE{max_mse:g}",
+            f"-jpeg-mse-compressed-{max_mse:g}",
+            {"max_mse": max_mse},
+        )
+    return "JPEG", "-jpeg-compressed", {}
 
-                    # Converte a matriz de pixels em uma imagem Pillow
-                    image = Image.fromarray(pixel_array)
 
-                    # Define o nome do arquivo JPEG
-                    jpeg_filename = os.path.splitext(file)[0] + ".jpeg"
-                    jpeg_path = os.path.join(output_dir, jpeg_filename)
+def compress_jpeg_file(
+    subdir,
+    file,
+    output_dir,
+    compute_metrics=False,
+    timing_path=None,
+    target_psnr=None,
+    max_mse=None,
+    dry_run=False,
+):
+    """
+    Converte um arquivo DICOM em JPEG e retorna o resultado da compressão. Com
+    target_psnr ou max_mse, a qualidade é escolhida por imagem e só o JPEG final é
+    gravado; com dry_run, nem ele (o tamanho é o do buffer). Objetos multiframe são
+    lidos quadro a quadro e geram um JPEG ('<arquivo>_f0001.jpeg') e um resultado
+    por quadro, retornados em lista.
+    """
+    dicom_path = os.path.join(subdir, file)
+    method = jpeg_variant(target_psnr, max_mse)[0]
+    timer = StageTimer(timing_path, file=dicom_path, method=method)
+    results = []
 
-                    # Salva a imagem como JPEG
-                    image.save(jpeg_path, format="JPEG")
+    try:
+        with timer.stage("getsize"):
+            file_size = os.path.getsize(dicom_path)  # bytes
+        timer.add_bytes("input", file_size)
 
-                    # Armazena os tamanhos dos arquivos
-                    original_size = os.path.getsize(dicom_path)  # bytes
-                    converted_size = os.path.getsize(jpeg_path)  # bytes
-                    compression_rate = (1 - converted_size / original_size) * 100
+        # Carrega cada quadro do DICOM e normaliza os pixels para 0-255
+        for frame, n_frames, pixel_array in timer.iter_stage(
+            "dcmread", iter_dicom_frames(dicom_path)
+        ):
+            with timer.stage("normalize"):
+                pixel_array = normalize_pixel_array(pixel_array)
 
-                    original_sizes.append(original_size)
-                    converted_sizes.append(converted_size)
-                    compression_rates.append(compression_rate)
+            # Define o nome do arquivo JPEG
+            jpeg_path = os.path.join(output_dir, frame_file_name(file, frame, ".jpeg"))
 
-                    update_compression_csv(
-                        f"{subdir.split('/')[-1]}/{file}",
-                        "JPEG",
-                        f"{compression_rate:.2f}",
-                        original_size,
-                        converted_size,
+            # Salva a imagem como JPEG
+            rate_control = target_psnr is not None or max_mse is not None
+            if rate_control:
+                # Tentativas em memória; só o JPEG escolhido vai para o disco
+                with timer.stage("rate_control"):
+                    data, quality, metrics = encode_jpeg_target(
+                        pixel_array, target_psnr, max_mse
                     )
+            else:
+                with timer.stage("encode"):
+                    data = encode_jpeg(pixel_array)
+            if not dry_run:
+                with timer.stage("write"):
+                    with open(jpeg_path, "wb") as jpeg_file:
+                        jpeg_file.write(data)
+
+            # Armazena os tamanhos dos arquivos
+            with timer.stage("getsize"):
+                original_size = file_size // n_frames  # bytes (fração do quadro)
+                converted_size = len(data) if dry_run else os.path.getsize(jpeg_path)
+            timer.add_bytes("output", converted_size)
+
+            result = {
+                "file_name": result_file_name(subdir, file, frame),
+                "method": method,
+                "original_size": original_size,
+                "converted_size": converted_size,
+                "output_path": None if dry_run else jpeg_path,
+                "compression_rate": calculate_compression_rate(
+                    original_size, converted_size
+                ),
+            }
+
+            # As métricas da qualidade escolhida já foram calculadas na busca
+            if rate_control:
+                result.update(metrics, jpeg_quality=quality)
+
+            # Decodifica o JPEG em memória e calcula MSE e PSNR
+            elif compute_metrics:
+                with timer.stage("metrics"):
+                    result.update(calculate_metrics(pixel_array, decode_jpeg(data)))
+
+            results.append(result)
+
+        return results if frame is not None else results[0]
+
+    except Exception as e:
+        print(f"Erro ao converter {dicom_path}: {e}")
+        return None
+
+    finally:
+        timer.write()
 
-                except Exception as e:
-                    print(f"Erro ao converter {dicom_path}: {e}")
-
-    # Calcula estatísticas
-    mean_original_size = np.mean(original_sizes)
-    mean_converted_size = np.mean(converted_sizes)
-    mean_compression_rate = np.mean(compression_rates)
-    std_dev_compression_rate = np.std(compression_rates)
-
-    # Exibe os resultados
-    summary = (
-        f"\nTotal de arquivos convertidos: {len(original_sizes)}\n"
-        f"Tamanho médio do arquivo original: {mean_original_size / 1024:.2f} KB\n"
-        f"Tamanho médio do arquivo comprimido: {mean_converted_size / 1024:.2f} KB\n"
-        f"Taxa de compressão média: {mean_compression_rate:.2f}%\n"
-        f"Desvio padrão da taxa de compressão: {std_dev_compression_rate:.2f}"
+
+def convert_dicom_to_jpeg(
+    input_dir,
+    workers=1,
+    force=False,
+    use_hash=False,
+    compute_metrics=False,
+    index_path=None,
+    timing_path=None,
+    target_psnr=None,
+    max_mse=None,
+    dry_run=False,
+):
+    # Cria o diretório de saída com sufixo '-jpeg-compressed' (ou o do alvo de
+    # qualidade, ex.: '-jpeg-psnr-compressed-40'); não é criado com dry_run
+    method, suffix, params = jpeg_variant(target_psnr, max_mse)
+    output_dir = input_dir + suffix
+    if not dry_run and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    results = []
+    start_timing_log(timing_path)
+    run_timer = StageTimer(timing_path, file=None, method=method)
+
+    # Manifesto das conversões já realizadas (execuções incrementais)
+    manifest = Manifest(
+        input_dir,
+        output_dir,
+        method,
+        params=params,
+        use_hash=use_hash,
+        force=force,
+        required_fields=("mse", "psnr") if compute_metrics else (),
+        dry_run=dry_run,
     )
-    print(summary)
 
-    # Salva os resultados em um arquivo txt
-    output_txt_path = f"{input_dir}-jpeg-compressed.txt"
-    with open(output_txt_path, "w") as txt_file:
-        txt_file.write(summary)
+    # Percorre todos os arquivos no diretório de entrada
+    with manifest, ResultsWriter() as writer:
+        for result in run_with_manifest(
+            partial(
+                compress_jpeg_file,
+                output_dir=output_dir,
+                compute_metrics=compute_metrics,
+                timing_path=timing_path,
+                target_psnr=target_psnr,
+                max_mse=max_mse,
+                dry_run=dry_run,
+            ),
+            input_dir,
+            workers,
+            manifest,
+            index_path,
+        ):
+            if result is None:
+                continue
+
+            results.append(result)
+            writer.add_result(result)
+
+    # Monta o CSV largo a partir dos resultados acumulados
+    with run_timer.stage("csv_rewrite"):
+        compact_results()
+
+    summarize_results(results, None if dry_run else f"{output_dir}.txt")
+    if params and results:
+        qualities = [result["jpeg_quality"] for result in results]
+        print(
+            f"Qualidade escolhida: média {np.mean(qualities):.1f} "
+            f"(mín. {min(qualities)}, máx. {max(qualities)})"
+        )
+
+    if timing_path:
+        run_timer.write()
+        summarize_timings(timing_path)
 
 
 # Exemplo de uso
 if __name__ == "__main__":
-    import sys
-
-    if len(sys.argv) != 2:
-        print("Uso: python script.py /caminho/para/pasta_de_entrada")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(
+        description="Converter um diretório de imagens DICOM em arquivos JPEG."
+    )
+    parser.add_argument(
+        "input_dir",
+        type=str,
+        help="Caminho para o diretório de imagens DICOM de entrada",
+    )
+    add_workers_argument(parser)
+    add_manifest_arguments(parser)
+    add_index_argument(parser)
+    add_metrics_argument(parser)
+    add_timing_argument(parser)
+    add_dry_run_argument(parser)
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument(
+        "--target-psnr",
+        type=float,
+        default=None,
+        help="Escolhe por imagem, por busca binária com tentativas em memória, a menor qualidade cujo PSNR atinge o alvo (dB)",
+    )
+    target.add_argument(
+        "--max-mse",
+        type=float,
+        default=None,
+        help="Como --target-psnr, com um MSE máximo como alvo",
+    )
 
-    input_dir = sys.argv[1]
+    args = parser.parse_args()
 
     # Chama a função de conversão
-    convert_dicom_to_jpeg(input_dir)
+    convert_dicom_to_jpeg(
+        args.input_dir,
+        args.workers,
+        args.force,
+        args.hash,
+        args.metrics,
+        args.index,
+        args.timings,
+        args.target_psnr,
+        args.max_mse,
+        args.dry_run,
+    )
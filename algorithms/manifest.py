@@ -0,0 +1,238 @@
+import hashlib
+import json
+import os
+from collections import defaultdict
+from dicom_utils import iter_dicom_files
+from parallel import run_tasks
+
+
+def iter_results(result):
+    """Resultados de um arquivo: a lista (um por quadro) de um objeto multiframe."""
+    return result if isinstance(result, list) else [result]
+
+
+class Manifest:
+    """
+    Registro das conversões já realizadas para um diretório de saída, salvo como
+    JSON lines em '<diretório de saída>.manifest.jsonl'. Cada entrada guarda a
+    identificação do arquivo de entrada (mtime+tamanho ou hash do conteúdo), o
+    codec, os parâmetros e o resultado, permitindo pular arquivos já convertidos.
+    Entradas cujo resultado não tem algum campo de required_fields (por exemplo,
+    MSE e PSNR) são consideradas desatualizadas. file_params(dicom_path), se
+    informado, retorna parâmetros próprios de cada arquivo (ex.: o hash da base do
+    seu grupo), guardados junto à identificação da entrada: só os arquivos cujos
+    parâmetros mudaram são reconvertidos. Com dry_run, todos os arquivos são
+    processados e nada é registrado.
+    """
+
+    def __init__(
+        self,
+        input_dir,
+        output_dir,
+        codec,
+        params=None,
+        use_hash=False,
+        force=False,
+        required_fields=(),
+        dry_run=False,
+        file_params=None,
+    ):
+        self.input_dir = input_dir
+        self.path = f"{output_dir}.manifest.jsonl"
+        self.codec = codec
+        self.params = params or {}
+        self.use_hash = use_hash
+        self.force = force
+        self.required_fields = required_fields
+        self.dry_run = dry_run
+        self.file_params = file_params
+        self.entries = {}
+        self.fingerprints = {}
+        self.file = None
+
+        # Carrega as entradas existentes; a mais recente de cada arquivo prevalece
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # Linha incompleta de uma execução interrompida
+                    self.entries[entry["file"]] = entry
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def key(self, dicom_path):
+        return os.path.relpath(dicom_path, self.input_dir)
+
+    def fingerprint(self, dicom_path):
+        """
+        Identifica o conteúdo do arquivo de entrada (hash ou mtime+tamanho) e os
+        parâmetros próprios do arquivo (file_params).
+        """
+        if self.use_hash:
+            digest = hashlib.sha256()
+            with open(dicom_path, "rb") as file:
+                for chunk in iter(lambda: file.read(1 << 20), b""):
+                    digest.update(chunk)
+            fingerprint = {"sha256": digest.hexdigest()}
+        else:
+            stat = os.stat(dicom_path)
+            fingerprint = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+        if self.file_params is not None:
+            fingerprint["params"] = self.file_params(dicom_path)
+        return fingerprint
+
+    def lookup(self, dicom_path, fingerprint=None):
+        """Retorna o resultado registrado se a entrada estiver atual, senão None."""
+        key = self.key(dicom_path)
+        fingerprint = fingerprint or self.fingerprint(dicom_path)
+        self.fingerprints[key] = fingerprint
+
+        entry = self.entries.get(key)
+        if (
+            self.force
+            or self.dry_run
+            or entry is None
+            or entry["codec"] != self.codec
+            or entry["params"] != self.params
+            or entry["source"] != fingerprint
+            or not os.path.exists(entry["output"])
+            or any(
+                field not in result
+                for result in iter_results(entry["result"])
+                for field in self.required_fields
+            )
+        ):
+            return None
+        return entry["result"]
+
+    def record(self, dicom_path, result):
+        """
+        Registra uma conversão concluída, anexando-a imediatamente ao manifesto. Em
+        objetos multiframe, result é a lista dos resultados dos quadros.
+        """
+        if self.dry_run:
+            return
+
+        key = self.key(dicom_path)
+        fingerprint = self.fingerprints.pop(key, None) or self.fingerprint(dicom_path)
+        entry = {
+            "file": key,
+            "codec": self.codec,
+            "params": self.params,
+            "source": fingerprint,
+            "output": iter_results(result)[0]["output_path"],
+            "result": result,
+        }
+        self.entries[key] = entry
+
+        if self.file is None:
+            self.file = open(self.path, "a", encoding="utf-8")
+        self.file.write(json.dumps(entry) + "\n")
+        self.file.flush()
+
+    def close(self):
+        """Fecha o manifesto, reescrevendo-o com apenas uma entrada por arquivo."""
+        if self.file is None:
+            return
+        self.file.close()
+        self.file = None
+
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            for entry in self.entries.values():
+                file.write(json.dumps(entry) + "\n")
+        os.replace(temp_path, self.path)
+
+
+def run_with_manifest(
+    function, input_dir, workers, manifest, index_path=None, blas_threads=None
+):
+    """
+    Converte os arquivos de input_dir cuja entrada no manifesto não está atual,
+    registrando cada conversão, e retorna também os resultados dos arquivos pulados.
+    """
+    tasks = []
+    skipped = 0
+    for subdir, file in iter_dicom_files(input_dir, index_path):
+        result = manifest.lookup(os.path.join(subdir, file))
+        if result is None:
+            tasks.append((subdir, file))
+        else:
+            skipped += 1
+            yield from iter_results(result)
+
+    if skipped:
+        print(f"Arquivos pulados (já convertidos com os mesmos parâmetros): {skipped}")
+
+    for (subdir, file), result in zip(
+        tasks, run_tasks(function, tasks, workers, blas_threads=blas_threads)
+    ):
+        if result is not None:
+            manifest.record(os.path.join(subdir, file), result)
+        yield from iter_results(result)
+
+
+def run_with_manifests(
+    function, input_dir, workers, manifests, index_path=None, blas_threads=None
+):
+    """
+    Como run_with_manifest, para conversões com várias saídas por arquivo (um
+    manifesto por método). function(subdir, file, methods) recebe os métodos cuja
+    entrada não está atual e retorna a lista de resultados do arquivo (de todos os
+    quadros, em objetos multiframe).
+    """
+    tasks = []
+    skipped = 0
+    first_manifest = next(iter(manifests.values()))
+    for subdir, file in iter_dicom_files(input_dir, index_path):
+        dicom_path = os.path.join(subdir, file)
+        fingerprint = first_manifest.fingerprint(dicom_path)
+        pending_methods = []
+        for method, manifest in manifests.items():
+            result = manifest.lookup(dicom_path, fingerprint)
+            if result is None:
+                pending_methods.append(method)
+            else:
+                yield from iter_results(result)
+        if pending_methods:
+            tasks.append((subdir, file, pending_methods))
+        else:
+            skipped += 1
+
+    if skipped:
+        print(f"Arquivos pulados (já convertidos com os mesmos parâmetros): {skipped}")
+
+    for (subdir, file, _), results in zip(
+        tasks, run_tasks(function, tasks, workers, blas_threads=blas_threads)
+    ):
+        # Um registro por método, com a lista de quadros em objetos multiframe
+        by_method = defaultdict(list)
+        for result in results:
+            by_method[result["method"]].append(result)
+        for method, method_results in by_method.items():
+            manifests[method].record(
+                os.path.join(subdir, file),
+                method_results if len(method_results) > 1 else method_results[0],
+            )
+        yield from results
+
+
+def add_manifest_arguments(parser):
+    """Adiciona as opções do manifesto (--force e --hash) a um ArgumentParser."""
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Reconverte todos os arquivos, ignorando o manifesto",
+    )
+    parser.add_argument(
+        "--hash",
+        action="store_true",
+        help="Identifica os arquivos de entrada pelo hash do conteúdo em vez de mtime+tamanho",
+    )
@@ -0,0 +1,109 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from threadpoolctl import threadpool_limits
+
+# Limite de threads do BLAS/OpenMP aplicado em cada processo do pool
+_blas_limits = None
+
+
+def limit_blas_threads(blas_threads):
+    """Inicializador do pool: limita as threads do BLAS/OpenMP do processo."""
+    global _blas_limits
+    if blas_threads:
+        _blas_limits = threadpool_limits(blas_threads)
+
+
+def run_tasks(function, tasks, workers=1, chunksize=8, blas_threads=None):
+    """
+    Executa function(*task) para cada tarefa e retorna os resultados na mesma ordem.
+    Com workers > 1 as tarefas são distribuídas em um pool de processos. Com
+    blas_threads, cada processo usa no máximo esse número de threads no BLAS.
+    """
+    if workers <= 1:
+        with threadpool_limits(blas_threads) if blas_threads else nullcontext():
+            for task in tasks:
+                yield function(*task)
+        return
+
+    tasks = list(tasks)
+    if not tasks:
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=limit_blas_threads,
+        initargs=(blas_threads,),
+    ) as executor:
+        yield from executor.map(function, *zip(*tasks), chunksize=chunksize)
+
+
+def cpu_splits(cpus):
+    """Divisões (processos, threads do BLAS por processo) de um orçamento de cpus."""
+    splits = []
+    threads = 1
+    while threads <= cpus:
+        splits.append((cpus // threads, threads))
+        threads *= 2
+    return splits
+
+
+def split_cpus(cpus, workers=1):
+    """
+    Divide o orçamento de cpus entre processos e threads do BLAS e retorna
+    (processos, threads). Sem --workers, um processo por cpu com uma thread cada
+    (a leitura com pydicom não usa o BLAS); com --workers, as cpus são divididas
+    entre eles.
+    """
+    if cpus is None:
+        return workers, None
+    if workers <= 1:
+        return cpus, 1
+    return workers, max(1, cpus // workers)
+
+
+def autotune_split(function, tasks, cpus):
+    """
+    Executa as tarefas com cada divisão de cpu_splits(cpus), exibe o tempo de cada
+    uma e retorna a mais rápida (processos, threads).
+    """
+    timings = {}
+    print(f"Calibrando a divisão de {cpus} cpus com {len(tasks)} tarefas:")
+    for workers, threads in cpu_splits(cpus):
+        start = time.perf_counter()
+        for _ in run_tasks(function, tasks, workers, 1, threads):
+            pass
+        timings[(workers, threads)] = time.perf_counter() - start
+        print(
+            f"  {workers:>3} processos × {threads:>3} threads: "
+            f"{timings[(workers, threads)]:.3f} s"
+        )
+
+    workers, threads = min(timings, key=timings.get)
+    print(f"Divisão escolhida: {workers} processos × {threads} threads")
+    return workers, threads
+
+
+def add_workers_argument(parser):
+    """Adiciona a opção --workers a um ArgumentParser."""
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Número de processos usados na conversão (padrão: 1)",
+    )
+
+
+def add_cpus_arguments(parser):
+    """Adiciona as opções --cpus e --autotune a um ArgumentParser."""
+    parser.add_argument(
+        "--cpus",
+        type=int,
+        default=None,
+        help="Orçamento de cpus dividido entre processos e threads do BLAS (sem --workers, um processo por cpu com uma thread cada)",
+    )
+    parser.add_argument(
+        "--autotune",
+        action="store_true",
+        help="Mede, com uma amostra dos arquivos, cada divisão de --cpus entre processos e threads e usa a mais rápida",
+    )
@@ -1,124 +1,640 @@
+import io
 import os
 import numpy as np
-import pydicom
 from sklearn.decomposition import PCA
+from sklearn.utils.extmath import randomized_svd, svd_flip
 import argparse
-from write_result_csv import update_compression_csv
-import matplotlib.pyplot as plt
+from contextlib import ExitStack
+from functools import partial
+from itertools import cycle, islice
+from dicom_utils import (
+    add_dry_run_argument,
+    add_index_argument,
+    add_metrics_argument,
+    calculate_compression_rate,
+    frame_file_name,
+    iter_dicom_files,
+    iter_dicom_frames,
+    iter_dicom_images,
+    normalize_pixel_array,
+    result_file_name,
+    summarize_results,
+)
+from manifest import Manifest, add_manifest_arguments, run_with_manifests
+from metrics import calculate_metrics, calculate_psnr
+from parallel import (
+    add_cpus_arguments,
+    add_workers_argument,
+    autotune_split,
+    split_cpus,
+)
+from pca_tiles import (
+    TILE_SIZES,
+    fit_tiles,
+    is_tile_npz,
+    reconstruct_tiles,
+    serialize_tiles,
+)
+from pca_container import (
+    COMPRESSIONS,
+    EXTENSION as CONTAINER_EXTENSION,
+    QUANTIZATIONS,
+    decode_container,
+    encode_container,
+    is_container,
+    zstandard,
+)
+from timing import StageTimer, add_timing_argument, start_timing_log, summarize_timings
+from write_result_csv import ResultsWriter, compact_results
 
+SVD_SOLVERS = ["full", "adaptive"]
 
-# Função para carregar uma imagem DICOM e convertê-la em um array numpy
-def load_dicom_image(file_path):
-    dicom = pydicom.dcmread(file_path, force=True)
-    image = dicom.pixel_array
-    return image
+# Erro médio do arredondamento da reconstrução para uint8 (uniforme em ±0,5)
+ROUNDING_MSE = 1 / 12
 
 
 # Função para aplicar PCA para compressão da imagem
-def perform_pca(image, variance_ratio):
+def perform_pca(image, variance_ratio, svd_solver="full"):
     """Aplica PCA a uma imagem e retorna a imagem comprimida e os componentes principais."""
-    gray_image = image.astype(np.float32)
+    return perform_pca_multi(image, [variance_ratio], svd_solver)[0]
 
-    # Aplica PCA mantendo uma determinada porcentagem de variância
-    pca = PCA(variance_ratio, svd_solver="full")
-    compressed_image = pca.fit_transform(gray_image)
-    principal_components = pca.components_
-    mean = pca.mean_
+
+def perform_pca_multi(image, variance_ratios, svd_solver="full"):
+    """
+    Decompõe a imagem uma única vez e retorna (imagem comprimida, componentes, média)
+    para cada variância, truncando a mesma decomposição no número de componentes
+    que PCA(variance_ratio, svd_solver="full") escolheria.
+    """
+    decomposition = pca_decomposition(
+        image.astype(np.float32), max(variance_ratios), svd_solver
+    )
+    return [truncate_pca(decomposition, ratio) for ratio in variance_ratios]
+
+
+def pca_decomposition(gray_image, variance_ratio, svd_solver="full"):
+    """
+    Retorna (U·S, componentes, média, variância explicada acumulada, energia total)
+    com pelo menos os componentes necessários para explicar variance_ratio da
+    variância. A energia total é a soma dos quadrados da imagem centralizada (soma
+    de todos os s²).
+    """
+    if svd_solver == "adaptive":
+        result = adaptive_decomposition(gray_image, variance_ratio)
+        if result is not None:
+            return result
+
+    # SVD completo mantendo todos os componentes
+    pca = PCA(svd_solver="full")
+    transformed = pca.fit_transform(gray_image)
+    ratio_cumsum = np.cumsum(pca.explained_variance_ratio_)
+    total_energy = pca.explained_variance_.sum(dtype=np.float64) * (len(gray_image) - 1)
+
+    return transformed, pca.components_, pca.mean_, ratio_cumsum, total_energy
+
+
+def variance_components(ratio_cumsum, variance_ratio):
+    """Componentes necessários para variance_ratio (mesma regra do sklearn)."""
+    n_components = np.searchsorted(ratio_cumsum, variance_ratio, side="right") + 1
+    return min(n_components, len(ratio_cumsum))
+
+
+def truncate_pca(decomposition, variance_ratio):
+    """Mantém os componentes necessários para variance_ratio (mesma regra do sklearn)."""
+    transformed, components, mean, ratio_cumsum, _ = decomposition
+    n_components = variance_components(ratio_cumsum, variance_ratio)
+
+    # Mesmo layout de memória do PCA(variance_ratio), para o NPZ ter o mesmo formato
+    compressed_image = transformed[:, :n_components]
+    principal_components = np.asarray(components[:n_components, :], copy=True)
 
     return compressed_image, principal_components, mean
 
 
-# Função para converter e comprimir um diretório de imagens DICOM usando PCA
-def convert_dicom_to_pca(input_dir, variance_ratio):
+def adaptive_decomposition(
+    gray_image, variance_ratio, initial_rank=16, power_iterations=4
+):
     """
-    Converte arquivos DICOM em arquivos PCA comprimidos e salva em um diretório de saída.
+    Decomposição por SVD randomizada truncada: aumenta o posto calculado até que os
+    componentes expliquem variance_ratio da variância total. Retorna None quando o
+    posto necessário passa de 1/8 da dimensão da imagem, caso em que o SVD completo
+    é mais rápido.
     """
-    # Cria o diretório de saída com sufixo '-pca-compressed'
-    output_dir = f"{input_dir}-pca-compressed-{int(variance_ratio * 1000)}"
-    os.makedirs(output_dir, exist_ok=True)
+    mean = gray_image.mean(axis=0)
+    centered = gray_image - mean
+    total_variance = np.einsum("ij,ij->", centered, centered, dtype=np.float64)
 
-    # Listas para armazenar tamanhos dos arquivos
-    original_sizes = []
-    converted_sizes = []
-    compression_rates = []
+    rank = initial_rank
+    while rank <= min(centered.shape) // 8 and total_variance > 0:
+        U, S, Vt = randomized_svd(
+            centered,
+            rank,
+            n_iter=power_iterations,
+            flip_sign=False,
+            random_state=0,
+        )
+        ratio_cumsum = np.cumsum(S.astype(np.float64) ** 2) / total_variance
+        if ratio_cumsum[-1] > variance_ratio:
+            U, Vt = svd_flip(U, Vt, u_based_decision=False)
+            # Mesmo layout (Fortran) do fit_transform
+            transformed = np.asfortranarray(U * S)
+            return (
+                transformed,
+                np.ascontiguousarray(Vt),
+                mean,
+                ratio_cumsum,
+                total_variance,
+            )
 
-    # Percorre todos os arquivos no diretório de entrada
-    for subdir, _, files in os.walk(input_dir):
-        for file in files:
-            if file.lower().endswith(".dcm"):
-                dicom_path = os.path.join(subdir, file)
-
-                try:
-                    # Carrega o arquivo DICOM
-                    image = load_dicom_image(dicom_path)
-
-                    # Verifica se a imagem é grayscale
-                    if len(image.shape) != 2:
-                        raise ValueError("A imagem DICOM não é grayscale.")
-
-                    # Normaliza os valores dos pixels para o intervalo 0-255
-                    pixel_array = (image - np.min(image)) / (
-                        np.max(image) - np.min(image)
-                    )
-                    pixel_array = (pixel_array * 255).astype(np.uint8)
+        # Os próximos valores singulares não passam do último calculado, o que dá um
+        # limite inferior para o posto necessário (ruído alto leva direto ao SVD completo)
+        missing_variance = (variance_ratio - ratio_cumsum[-1]) * total_variance
+        minimum_rank = rank + int(np.ceil(missing_variance / max(S[-1] ** 2, 1e-12)))
+        rank = max(rank * 2, minimum_rank)
 
-                    # Aplica PCA com a variância informada
-                    compressed_image, principal_components, mean = perform_pca(
-                        pixel_array, variance_ratio
-                    )
+    return None
 
-                    # Define o nome do arquivo NPZ
-                    npz_filename = os.path.splitext(file)[0] + ".npz"
-                    npz_path = os.path.join(output_dir, npz_filename)
 
-                    # Salva a imagem comprimida e os componentes principais em NPZ
-                    np.savez(
-                        npz_path,
-                        compressed_image=compressed_image,
-                        principal_components=principal_components,
-                        mean=mean,
-                    )
+def predicted_error(decomposition, variance_ratio, pixels):
+    """
+    MSE e PSNR previstos a partir dos valores singulares descartados ao manter
+    variance_ratio: soma dos s² descartados / número de pixels (o erro exato da
+    reconstrução em ponto flutuante) mais o erro do arredondamento para uint8.
+    """
+    ratio_cumsum, total_energy = decomposition[3:]
+    n_components = variance_components(ratio_cumsum, variance_ratio)
+    discarded = max(1 - float(ratio_cumsum[n_components - 1]), 0) * total_energy
+    mse = round(discarded / pixels + ROUNDING_MSE, 2)
+    return {"predicted_mse": mse, "predicted_psnr": calculate_psnr(mse)}
 
-                    # Armazena os tamanhos dos arquivos
-                    original_size = os.path.getsize(dicom_path)  # bytes
-                    converted_size = os.path.getsize(npz_path)  # bytes
-                    compression_rate = (1 - converted_size / original_size) * 100
-
-                    original_sizes.append(original_size)
-                    converted_sizes.append(converted_size)
-                    compression_rates.append(compression_rate)
-
-                    update_compression_csv(
-                        f"{subdir.split('/')[-1]}/{file}",
-                        f"PCA-{int(variance_ratio * 1000)}",
-                        f"{compression_rate:.2f}",
-                        original_size,
-                        converted_size,
-                    )
 
-                except Exception as e:
-                    print(f"Erro ao converter {dicom_path}: {e}")
-
-    # Calcula estatísticas
-    mean_original_size = np.mean(original_sizes)
-    mean_converted_size = np.mean(converted_sizes)
-    mean_compression_rate = np.mean(compression_rates)
-    std_dev_compression_rate = np.std(compression_rates)
-
-    # Exibe os resultados
-    summary = (
-        f"\nTotal de arquivos convertidos: {len(original_sizes)}\n"
-        f"Tamanho médio do arquivo original: {mean_original_size / 1024:.2f} KB\n"
-        f"Tamanho médio do arquivo comprimido: {mean_converted_size / 1024:.2f} KB\n"
-        f"Taxa de compressão média: {mean_compression_rate:.2f}%\n"
-        f"Desvio padrão da taxa de compressão: {std_dev_compression_rate:.2f}"
+def psnr_variance_ratio(gray_image, target_psnr, max_pixel=255.0):
+    """
+    Variância a manter para que o PSNR previsto passe de target_psnr: o erro
+    permitido (MSE alvo, descontado o arredondamento para uint8, × pixels) é a
+    energia que pode ser descartada.
+    """
+    centered = gray_image - gray_image.mean(axis=0)
+    total_energy = np.einsum("ij,ij->", centered, centered, dtype=np.float64)
+    if total_energy == 0:
+        return 0.0
+
+    allowed_mse = max_pixel**2 / 10 ** (target_psnr / 10) - ROUNDING_MSE
+    allowed_energy = max(allowed_mse, 0.0) * gray_image.size
+    return max(1 - allowed_energy / total_energy, 0.0)
+
+
+def encode_pca(pixel_array, variance_ratio, svd_solver="full", container=None):
+    """Aplica PCA a uma matriz uint8 e retorna os bytes do arquivo NPZ (ou .pcaz)."""
+    return encode_pca_multi(pixel_array, [variance_ratio], svd_solver, container)[0]
+
+
+def encode_pca_multi(pixel_array, variance_ratios, svd_solver="full", container=None):
+    """Retorna os bytes do NPZ de cada variância, a partir de uma única decomposição."""
+    # Verifica se a imagem é grayscale
+    if len(pixel_array.shape) != 2:
+        raise ValueError("A imagem DICOM não é grayscale.")
+
+    return [
+        serialize_pca(*pca_arrays, container=container)
+        for pca_arrays in perform_pca_multi(pixel_array, variance_ratios, svd_solver)
+    ]
+
+
+def serialize_pca(compressed_image, principal_components, mean, container=None):
+    """
+    Salva a imagem comprimida e os componentes principais em NPZ e retorna os bytes.
+    Com container ({"quantization", "compression"}) usa o formato .pcaz.
+    """
+    if container:
+        return encode_container(
+            compressed_image, principal_components, mean, **container
+        )
+
+    buffer = io.BytesIO()
+    np.savez(
+        buffer,
+        compressed_image=compressed_image,
+        principal_components=principal_components,
+        mean=mean,
     )
-    print(summary)
+    return buffer.getvalue()
+
+
+def container_name(container):
+    return f"{container['quantization']}-{container['compression']}"
+
+
+def pca_method(variance_ratio, container=None, tile_size=None):
+    """
+    Nome do método PCA usado nos resultados e no CSV (ex.: PCA-950,
+    PCA-950-INT8-ZLIB ou PCA-TILE8-950).
+    """
+    if tile_size:
+        return f"PCA-TILE{tile_size}-{int(variance_ratio * 1000)}"
+    method = f"PCA-{int(variance_ratio * 1000)}"
+    if container:
+        method += "-" + container_name(container).upper()
+    return method
+
+
+def pca_suffix(variance_ratio, container=None, tile_size=None):
+    """Sufixo do diretório de saída (ex.: -pca-compressed-950-int8-zlib)."""
+    if tile_size:
+        return f"-pca-tile{tile_size}-compressed-{int(variance_ratio * 1000)}"
+    suffix = f"-pca-compressed-{int(variance_ratio * 1000)}"
+    if container:
+        suffix += "-" + container_name(container)
+    return suffix
+
+
+def psnr_method(target_psnr, container=None):
+    """Nome do método PCA com PSNR alvo (ex.: PCA-PSNR40, PCA-PSNR40-INT8-ZLIB)."""
+    method = f"PCA-PSNR{target_psnr:g}"
+    if container:
+        method += "-" + container_name(container).upper()
+    return method
+
 
-    # Salva os resultados em um arquivo txt
-    output_txt_path = f"{input_dir}-pca-compressed-{int(variance_ratio * 1000)}.txt"
-    with open(output_txt_path, "w") as txt_file:
-        txt_file.write(summary)
+def psnr_suffix(target_psnr, container=None):
+    """Sufixo do diretório de saída com PSNR alvo (ex.: -pca-psnr-compressed-40)."""
+    suffix = f"-pca-psnr-compressed-{target_psnr:g}"
+    if container:
+        suffix += "-" + container_name(container)
+    return suffix
+
+
+def pca_extension(container=None):
+    return CONTAINER_EXTENSION if container else ".npz"
+
+
+def pca_params(
+    variance_ratio, svd_solver="full", container=None, tile_size=None, target_psnr=None
+):
+    """Parâmetros do PCA registrados no manifesto (o solver só quando não é o padrão)."""
+    if target_psnr is not None:
+        params = {"target_psnr": target_psnr}
+    else:
+        params = {"variance_ratio": variance_ratio}
+    if tile_size:
+        params["tile_size"] = tile_size
+        return params
+    if svd_solver != "full":
+        params["svd_solver"] = svd_solver
+    if container:
+        params["container"] = container
+    return params
+
+
+def add_tile_size_argument(parser):
+    """Adiciona a opção --tile-size (codec PCA por blocos) a um ArgumentParser."""
+    parser.add_argument(
+        "--tile-size",
+        type=int,
+        choices=TILE_SIZES,
+        default=None,
+        help="Aplica PCA a blocos tile_size×tile_size em vez das linhas da imagem, mantendo em cada bloco os componentes necessários para a variância",
+    )
+
+
+def add_container_arguments(parser):
+    """Adiciona as opções do formato de saída (--container, --quantization e --entropy)."""
+    parser.add_argument(
+        "--container",
+        choices=["npz", "pcaz"],
+        default="npz",
+        help="NPZ float32 (padrão) ou formato .pcaz quantizado e comprimido",
+    )
+    parser.add_argument(
+        "--quantization",
+        choices=QUANTIZATIONS,
+        default="int8",
+        help="Quantização dos coeficientes e componentes no formato .pcaz (int8 com uma escala por componente)",
+    )
+    parser.add_argument(
+        "--entropy",
+        choices=COMPRESSIONS,
+        default="zlib",
+        help="Compressão do formato .pcaz (zstd requer o pacote 'zstandard')",
+    )
+
+
+def container_from_args(args):
+    """Parâmetros do formato .pcaz, ou None para NPZ."""
+    if args.container == "npz":
+        return None
+    if args.entropy == "zstd" and zstandard is None:
+        raise SystemExit("Compressão zstd requer o pacote 'zstandard'.")
+    return {"quantization": args.quantization, "compression": args.entropy}
+
+
+def add_svd_solver_argument(parser):
+    """Adiciona a opção --svd-solver a um ArgumentParser."""
+    parser.add_argument(
+        "--svd-solver",
+        choices=SVD_SOLVERS,
+        default="full",
+        help="SVD completo (padrão) ou SVD randomizada com posto adaptativo, mais rápida quando poucos componentes são mantidos",
+    )
+
+
+def decode_pca(data):
+    """Reconstrói a imagem uint8 a partir dos bytes de um arquivo NPZ ou .pcaz."""
+    if is_container(data):
+        compressed_image, principal_components, mean = decode_container(data)
+    else:
+        npz = np.load(io.BytesIO(data))
+        if is_tile_npz(npz):
+            return reconstruct_tiles(npz)
+        compressed_image = npz["compressed_image"]
+        principal_components = npz["principal_components"]
+        mean = npz["mean"]
+
+    # Reconstroi a imagem usando os componentes principais
+    reconstructed_image = np.dot(compressed_image, principal_components) + mean
+    return np.clip(np.rint(reconstructed_image), 0, 255).astype(np.uint8)
+
+
+def compress_pca_file(
+    subdir,
+    file,
+    methods,
+    variants,
+    compute_metrics=False,
+    timing_path=None,
+    svd_solver="full",
+    container=None,
+    tile_size=None,
+    dry_run=False,
+):
+    """
+    Converte um arquivo DICOM em um NPZ por variante PCA pendente (methods), todos
+    a partir de uma única decomposição, e retorna a lista de resultados. Variantes
+    com target_psnr mantêm os componentes cujo PSNR previsto passa do alvo; o
+    MSE/PSNR previsto pelos valores singulares é registrado em todas. Com dry_run,
+    os NPZ ficam só em memória e o tamanho é o do buffer. Objetos multiframe são
+    lidos e decompostos quadro a quadro, com um NPZ ('<arquivo>_f0001.npz') e um
+    resultado por quadro e variante.
+    """
+    dicom_path = os.path.join(subdir, file)
+    results = []
+    timer = StageTimer(timing_path, file=dicom_path, method="PCA")
+
+    try:
+        with timer.stage("getsize"):
+            file_size = os.path.getsize(dicom_path)  # bytes
+        timer.add_bytes("input", file_size)
+
+        # Carrega cada quadro do DICOM e normaliza os pixels para 0-255
+        for frame, n_frames, pixel_array in timer.iter_stage(
+            "dcmread", iter_dicom_frames(dicom_path)
+        ):
+            with timer.stage("normalize"):
+                pixel_array = normalize_pixel_array(pixel_array)
+
+            # Verifica se a imagem é grayscale
+            if len(pixel_array.shape) != 2:
+                raise ValueError("A imagem DICOM não é grayscale.")
+
+            # Aplica PCA uma única vez para todas as variâncias
+            gray_image = pixel_array.astype(np.float32)
+            variance_ratios = [
+                (
+                    psnr_variance_ratio(gray_image, variants[method]["target_psnr"])
+                    if "target_psnr" in variants[method]
+                    else variants[method]["variance_ratio"]
+                )
+                for method in methods
+            ]
+            predictions = [{} for _ in methods]
+            with timer.stage("pca_fit"):
+                if tile_size:
+                    tile_fit = fit_tiles(pixel_array, tile_size)
+                    serializers = [
+                        partial(
+                            serialize_tiles,
+                            tile_fit,
+                            variance_ratio,
+                            pixel_array.shape,
+                            tile_size,
+                        )
+                        for variance_ratio in variance_ratios
+                    ]
+                else:
+                    decomposition = pca_decomposition(
+                        gray_image, max(variance_ratios), svd_solver
+                    )
+                    serializers = [
+                        partial(
+                            serialize_pca,
+                            *truncate_pca(decomposition, variance_ratio),
+                            container=container,
+                        )
+                        for variance_ratio in variance_ratios
+                    ]
+                    predictions = [
+                        predicted_error(decomposition, variance_ratio, pixel_array.size)
+                        for variance_ratio in variance_ratios
+                    ]
+
+            # Define o nome do arquivo NPZ
+            npz_filename = frame_file_name(file, frame, pca_extension(container))
+            original_size = file_size // n_frames  # bytes (fração do quadro)
+
+            for method, serialize, prediction in zip(methods, serializers, predictions):
+                npz_path = os.path.join(variants[method]["output_dir"], npz_filename)
+
+                # Salva o arquivo NPZ da variante
+                with timer.stage(f"{method}:serialize"):
+                    data = serialize()
+                if not dry_run:
+                    with timer.stage(f"{method}:write"):
+                        with open(npz_path, "wb") as npz_file:
+                            npz_file.write(data)
+
+                with timer.stage("getsize"):
+                    converted_size = len(data) if dry_run else os.path.getsize(npz_path)
+                timer.add_bytes(f"{method}:output", converted_size)
+
+                result = {
+                    "file_name": result_file_name(subdir, file, frame),
+                    "method": method,
+                    "original_size": original_size,
+                    "converted_size": converted_size,
+                    "output_path": None if dry_run else npz_path,
+                    "compression_rate": calculate_compression_rate(
+                        original_size, converted_size
+                    ),
+                    **prediction,
+                }
+
+                # Decodifica o NPZ em memória e calcula MSE e PSNR
+                if compute_metrics:
+                    with timer.stage(f"{method}:metrics"):
+                        result.update(calculate_metrics(pixel_array, decode_pca(data)))
+
+                results.append(result)
+
+    except Exception as e:
+        print(f"Erro ao converter {dicom_path}: {e}")
+        # Sem registro no manifesto: o arquivo é reconvertido na próxima execução
+        results = []
+
+    finally:
+        timer.write()
+
+    return results
+
+
+def decompose_pca_file(
+    subdir, file, variance_ratios, svd_solver="full", tile_size=None
+):
+    """
+    Lê, normaliza e decompõe um DICOM (quadro a quadro, se multiframe) sem gravar
+    saídas (calibração de --cpus).
+    """
+    for pixel_array in iter_dicom_images([os.path.join(subdir, file)]):
+        if tile_size:
+            fit_tiles(pixel_array, tile_size)
+        else:
+            perform_pca_multi(pixel_array, variance_ratios, svd_solver)
+
+
+def autotune_pca(
+    input_dir,
+    variance_ratios,
+    cpus,
+    svd_solver="full",
+    tile_size=None,
+    index_path=None,
+    sample_size=None,
+):
+    """
+    Escolhe a divisão de cpus entre processos e threads do BLAS mais rápida para
+    as imagens de input_dir, decompondo uma amostra dos arquivos (repetida até
+    sample_size tarefas, 4 por cpu por padrão) com cada divisão.
+    """
+    sample_size = sample_size or 4 * cpus
+    files = list(islice(iter_dicom_files(input_dir, index_path), sample_size))
+    if not files:
+        return split_cpus(cpus)
+
+    tasks = [
+        (subdir, file, variance_ratios, svd_solver, tile_size)
+        for subdir, file in islice(cycle(files), sample_size)
+    ]
+    return autotune_split(decompose_pca_file, tasks, cpus)
+
+
+# Função para converter e comprimir um diretório de imagens DICOM usando PCA
+def convert_dicom_to_pca(
+    input_dir,
+    variance_ratios,
+    workers=1,
+    force=False,
+    use_hash=False,
+    compute_metrics=False,
+    index_path=None,
+    timing_path=None,
+    svd_solver="full",
+    container=None,
+    tile_size=None,
+    target_psnrs=(),
+    blas_threads=None,
+    dry_run=False,
+):
+    """
+    Converte arquivos DICOM em arquivos PCA comprimidos, um diretório de saída por
+    variância (e por PSNR alvo), decompondo cada imagem uma única vez. Com dry_run,
+    apenas mede os tamanhos, sem criar os diretórios nem gravar as saídas.
+    """
+    start_timing_log(timing_path)
+    run_timer = StageTimer(timing_path, file=None, method="PCA")
+
+    # Cria um diretório de saída e um manifesto por variância
+    variants = {}
+    manifests = {}
+    for variance_ratio in variance_ratios:
+        method = pca_method(variance_ratio, container, tile_size)
+        output_dir = input_dir + pca_suffix(variance_ratio, container, tile_size)
+        if not dry_run:
+            os.makedirs(output_dir, exist_ok=True)
+
+        variants[method] = {"variance_ratio": variance_ratio, "output_dir": output_dir}
+        manifests[method] = Manifest(
+            input_dir,
+            output_dir,
+            method,
+            params=pca_params(variance_ratio, svd_solver, container, tile_size),
+            use_hash=use_hash,
+            force=force,
+            required_fields=("mse", "psnr") if compute_metrics else (),
+            dry_run=dry_run,
+        )
+
+    for target_psnr in target_psnrs:
+        method = psnr_method(target_psnr, container)
+        output_dir = input_dir + psnr_suffix(target_psnr, container)
+        if not dry_run:
+            os.makedirs(output_dir, exist_ok=True)
+
+        variants[method] = {"target_psnr": target_psnr, "output_dir": output_dir}
+        manifests[method] = Manifest(
+            input_dir,
+            output_dir,
+            method,
+            params=pca_params(None, svd_solver, container, target_psnr=target_psnr),
+            use_hash=use_hash,
+            force=force,
+            required_fields=("mse", "psnr") if compute_metrics else (),
+            dry_run=dry_run,
+        )
+
+    results = {method: [] for method in variants}
+
+    # Percorre todos os arquivos no diretório de entrada
+    with ExitStack() as stack, ResultsWriter() as writer:
+        for manifest in manifests.values():
+            stack.enter_context(manifest)
+
+        for result in run_with_manifests(
+            partial(
+                compress_pca_file,
+                variants=variants,
+                compute_metrics=compute_metrics,
+                timing_path=timing_path,
+                svd_solver=svd_solver,
+                container=container,
+                tile_size=tile_size,
+                dry_run=dry_run,
+            ),
+            input_dir,
+            workers,
+            manifests,
+            index_path,
+            blas_threads,
+        ):
+            results[result["method"]].append(result)
+            writer.add_result(result)
+
+    # Monta o CSV largo a partir dos resultados acumulados
+    with run_timer.stage("csv_rewrite"):
+        compact_results()
+
+    for method, variant in variants.items():
+        print(f"\n{method}:")
+        summarize_results(
+            results[method], None if dry_run else f"{variant['output_dir']}.txt"
+        )
+
+        predicted = [
+            r["predicted_psnr"] for r in results[method] if "predicted_psnr" in r
+        ]
+        if predicted:
+            print(f"PSNR previsto médio: {np.mean(predicted):.2f} dB")
+
+    if timing_path:
+        run_timer.write()
+        summarize_timings(timing_path)
 
 
 # Exemplo de uso
@@ -132,11 +648,66 @@ if __name__ == "__main__":
         help="Caminho para o diretório de imagens DICOM de entrada",
     )
     parser.add_argument(
-        "variance_ratio",
+        "variance_ratios",
+        type=float,
+        nargs="*",
+        help="Quantidades de variância a serem mantidas (entre 0 e 1); todas são geradas a partir de uma única decomposição",
+    )
+    parser.add_argument(
+        "--target-psnr",
         type=float,
-        help="Quantidade de variância a ser mantida (entre 0 e 1)",
+        nargs="+",
+        default=[],
+        help="PSNRs alvo (dB): para cada um, mantém em cada imagem os componentes necessários para que o PSNR previsto pelos valores singulares passe do alvo",
     )
+    add_workers_argument(parser)
+    add_manifest_arguments(parser)
+    add_index_argument(parser)
+    add_metrics_argument(parser)
+    add_timing_argument(parser)
+    add_dry_run_argument(parser)
+    add_svd_solver_argument(parser)
+    add_container_arguments(parser)
+    add_tile_size_argument(parser)
+    add_cpus_arguments(parser)
 
     args = parser.parse_args()
+    if not args.variance_ratios and not args.target_psnr:
+        parser.error("informe ao menos uma variância ou --target-psnr")
+    if args.tile_size and args.container != "npz":
+        parser.error("--tile-size grava apenas NPZ (não use com --container pcaz)")
+    if args.tile_size and args.target_psnr:
+        parser.error("--target-psnr não está disponível com --tile-size")
+    if args.autotune and not args.cpus:
+        parser.error("--autotune requer --cpus")
+
+    # Divide o orçamento de cpus entre processos e threads do BLAS
+    if args.autotune:
+        workers, blas_threads = autotune_pca(
+            args.input_dir,
+            args.variance_ratios or [0.99],
+            args.cpus,
+            args.svd_solver,
+            args.tile_size,
+            args.index,
+        )
+    else:
+        workers, blas_threads = split_cpus(args.cpus, args.workers)
+
     # Chama a função de conversão
-    convert_dicom_to_pca(args.input_dir, args.variance_ratio)
+    convert_dicom_to_pca(
+        args.input_dir,
+        args.variance_ratios,
+        workers,
+        args.force,
+        args.hash,
+        args.metrics,
+        args.index,
+        args.timings,
+        args.svd_solver,
+        container_from_args(args),
+        args.tile_size,
+        args.target_psnr,
+        blas_threads,
+        args.dry_run,
+    )
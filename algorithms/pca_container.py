@@ -0,0 +1,153 @@
+import json
+import struct
+import zlib
+import numpy as np
+
+try:
+    import zstandard
+except ImportError:  # zstd é opcional
+    zstandard = None
+
+# Formato .pcaz: MAGIC, versão (uint8), tamanho do cabeçalho (uint32), cabeçalho JSON
+# e os arrays (imagem comprimida, componentes e média) em um único bloco comprimido
+MAGIC = b"PCAZ"
+VERSION = 1
+EXTENSION = ".pcaz"
+PREFIX = struct.Struct("<4sBI")
+
+QUANTIZATIONS = ["float32", "float16", "int8"]
+COMPRESSIONS = ["zlib", "zstd", "none"]
+
+
+def quantize(array, quantization):
+    """
+    Quantiza um array 2D e retorna (valores, escalas). Em int8 cada coluna tem sua
+    escala (máximo absoluto / 127); em float16/float32 não há escala.
+    """
+    if quantization == "float32":
+        return array.astype(np.float32), None
+    if quantization == "float16":
+        return array.astype(np.float16), None
+
+    scales = np.abs(array).max(axis=0).astype(np.float32) / 127
+    scales[scales == 0] = 1
+    values = np.round(array / scales).astype(np.int8)
+    return values, scales
+
+
+def dequantize(values, scales):
+    values = values.astype(np.float32)
+    if scales is not None:
+        values *= scales
+    return values
+
+
+def compress_payload(payload, compression):
+    if compression == "zlib":
+        return zlib.compress(payload, 9)
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Compressão zstd requer o pacote 'zstandard'.")
+        return zstandard.ZstdCompressor(level=19).compress(payload)
+    return payload
+
+
+def decompress_payload(payload, compression):
+    if compression == "zlib":
+        return zlib.decompress(payload)
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Compressão zstd requer o pacote 'zstandard'.")
+        return zstandard.ZstdDecompressor().decompress(payload)
+    return payload
+
+
+def encode_container(
+    compressed_image,
+    principal_components,
+    mean,
+    quantization="int8",
+    compression="zlib",
+):
+    """Serializa o resultado do PCA no formato .pcaz e retorna os bytes."""
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Quantização desconhecida: {quantization}")
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Compressão desconhecida: {compression}")
+
+    # Coeficientes com uma escala por componente (coluna); componentes com uma
+    # escala por componente (linha, por isso a transposição)
+    coefficients, coefficient_scales = quantize(compressed_image, quantization)
+    components, component_scales = quantize(principal_components.T, quantization)
+    components = components.T
+    mean = mean.astype(np.float32 if quantization == "float32" else np.float16)
+
+    arrays = {
+        "compressed_image": coefficients,
+        "coefficient_scales": coefficient_scales,
+        "principal_components": components,
+        "component_scales": component_scales,
+        "mean": mean,
+    }
+    arrays = {name: array for name, array in arrays.items() if array is not None}
+
+    header = {
+        "quantization": quantization,
+        "compression": compression,
+        "arrays": [
+            {"name": name, "dtype": array.dtype.str, "shape": list(array.shape)}
+            for name, array in arrays.items()
+        ],
+    }
+    header_bytes = json.dumps(header, separators=(",", ":")).encode()
+    payload = b"".join(
+        np.ascontiguousarray(array).tobytes() for array in arrays.values()
+    )
+
+    return (
+        PREFIX.pack(MAGIC, VERSION, len(header_bytes))
+        + header_bytes
+        + compress_payload(payload, compression)
+    )
+
+
+def is_container(data):
+    return data[: len(MAGIC)] == MAGIC
+
+
+def read_header(data):
+    """Retorna o cabeçalho JSON e a posição onde começa o bloco comprimido."""
+    magic, version, header_size = PREFIX.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Arquivo não está no formato .pcaz")
+    if version > VERSION:
+        raise ValueError(f"Versão {version} do formato .pcaz não suportada")
+
+    start = PREFIX.size + header_size
+    return json.loads(data[PREFIX.size : start]), start
+
+
+def decode_container(data):
+    """Lê um .pcaz e retorna (imagem comprimida, componentes, média) em float32."""
+    header, start = read_header(data)
+    payload = decompress_payload(data[start:], header["compression"])
+
+    arrays = {}
+    offset = 0
+    for spec in header["arrays"]:
+        dtype = np.dtype(spec["dtype"])
+        count = int(np.prod(spec["shape"]))
+        arrays[spec["name"]] = np.frombuffer(payload, dtype, count, offset).reshape(
+            spec["shape"]
+        )
+        offset += count * dtype.itemsize
+
+    compressed_image = dequantize(
+        arrays["compressed_image"], arrays.get("coefficient_scales")
+    )
+    principal_components = dequantize(
+        arrays["principal_components"].T, arrays.get("component_scales")
+    ).T
+    mean = arrays["mean"].astype(np.float32)
+
+    return compressed_image, principal_components, mean
@@ -0,0 +1,233 @@
+import os
+import struct
+import zipfile
+from collections import OrderedDict, defaultdict
+import numpy as np
+from pca_container import EXTENSION as CONTAINER_EXTENSION, decode_container
+from pca_shared import load_basis, reconstruct_slice_region
+from pca_tiles import reconstruct_tile_region
+
+# Cabeçalho local de um membro do ZIP (os tamanhos do nome e do campo extra ficam
+# nos dois últimos campos)
+LOCAL_HEADER = struct.Struct("<4s5H3I2H")
+
+
+def open_npz_arrays(npz_path):
+    """
+    Retorna os arrays de um NPZ mapeados em memória (np.memmap), sem ler os dados.
+    O np.savez grava os membros sem compressão, então cada array é uma faixa
+    contígua do arquivo; membros comprimidos (np.savez_compressed) e escalares são
+    lidos normalmente.
+    """
+    arrays = {}
+    with zipfile.ZipFile(npz_path) as archive, open(npz_path, "rb") as file:
+        for info in archive.infolist():
+            name = info.filename.removesuffix(".npy")
+            if info.compress_type != zipfile.ZIP_STORED:
+                with archive.open(info) as member:
+                    arrays[name] = np.lib.format.read_array(member)
+                continue
+
+            # Pula o cabeçalho local do ZIP e o cabeçalho do .npy
+            file.seek(info.header_offset)
+            local_header = LOCAL_HEADER.unpack(file.read(LOCAL_HEADER.size))
+            file.seek(local_header[-2] + local_header[-1], os.SEEK_CUR)
+            if np.lib.format.read_magic(file) == (1, 0):
+                header = np.lib.format.read_array_header_1_0(file)
+            else:
+                header = np.lib.format.read_array_header_2_0(file)
+            shape, fortran_order, dtype = header
+
+            if len(shape) == 0 or 0 in shape:
+                arrays[name] = np.fromfile(file, dtype, int(np.prod(shape))).reshape(
+                    shape
+                )
+            else:
+                arrays[name] = np.memmap(
+                    npz_path,
+                    dtype,
+                    "r",
+                    file.tell(),
+                    shape,
+                    "F" if fortran_order else "C",
+                )
+    return arrays
+
+
+def reconstruct_region(compressed_image, principal_components, mean, rows, columns):
+    """
+    Reconstrói apenas as linhas e colunas pedidas (slices) de uma imagem PCA (ou de
+    todos os quadros de um volume multiframe).
+    """
+    region = (
+        np.dot(compressed_image[..., rows, :], principal_components[:, columns])
+        + mean[columns]
+    )
+    return np.clip(np.rint(region), 0, 255).astype(np.uint8)
+
+
+def read_pca_factors(path):
+    """
+    Lê (imagem comprimida, componentes, média) de um arquivo PCA por linhas (NPZ,
+    NPZ com base compartilhada ou .pcaz), com os NPZ mapeados em memória. Retorna
+    None para NPZ por blocos e por fatias de uma série, que não têm essa forma.
+    """
+    if path.endswith(CONTAINER_EXTENSION):
+        # O .pcaz é um único bloco comprimido e precisa ser descomprimido por inteiro
+        with open(path, "rb") as file:
+            return decode_container(file.read())
+
+    arrays = open_npz_arrays(path)
+    if "tile_size" in arrays:
+        return None
+
+    if "basis" in arrays:
+        # Base compartilhada (pca_shared), salva no mesmo diretório
+        principal_components, mean, image_shape = load_basis(
+            os.path.join(os.path.dirname(path), str(arrays["basis"]))
+        )
+        if image_shape is not None:
+            return None
+    else:
+        principal_components, mean = arrays["principal_components"], arrays["mean"]
+    return arrays["compressed_image"], principal_components, mean
+
+
+def reconstruct_npz_region(path, rows=slice(None), columns=slice(None)):
+    """Região de um NPZ por blocos ou por fatias de uma série (base por fatias)."""
+    arrays = open_npz_arrays(path)
+    if "tile_size" in arrays:
+        return reconstruct_tile_region(arrays, rows, columns)
+
+    basis = load_basis(os.path.join(os.path.dirname(path), str(arrays["basis"])))
+    return reconstruct_slice_region(arrays["compressed_image"], *basis, rows, columns)
+
+
+def decode_pca_region(path, rows=slice(None), columns=slice(None)):
+    """
+    Reconstrói a região (rows, columns) de um arquivo PCA (NPZ por linhas, por
+    blocos ou com base compartilhada, ou .pcaz). Nos NPZ os arrays são mapeados em
+    memória, de modo que só as linhas de coeficientes da região são lidas do disco
+    e o produto de matrizes é feito apenas para a região.
+    """
+    factors = read_pca_factors(path)
+    if factors is None:
+        return reconstruct_npz_region(path, rows, columns)
+    return reconstruct_region(*factors, rows, columns)
+
+
+class DecodeCache:
+    """
+    Cache LRU de imagens reconstruídas, limitado pelo total de bytes. A chave
+    inclui a data de modificação e o tamanho do arquivo, de modo que um arquivo
+    regravado é decodificado de novo.
+    """
+
+    def __init__(self, max_bytes=512 * 2**20):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.images = OrderedDict()
+
+    @staticmethod
+    def key(path):
+        stat = os.stat(path)
+        return os.path.abspath(path), stat.st_mtime_ns, stat.st_size
+
+    def get(self, key):
+        image = self.images.get(key)
+        if image is not None:
+            self.images.move_to_end(key)
+        return image
+
+    def put(self, key, image):
+        if image.nbytes > self.max_bytes or key in self.images:
+            return
+
+        # As imagens são compartilhadas entre as consultas: somente leitura
+        image.flags.writeable = False
+        self.images[key] = image
+        self.size += image.nbytes
+        while self.size > self.max_bytes:
+            _, evicted = self.images.popitem(last=False)
+            self.size -= evicted.nbytes
+
+
+def reconstruct_batch(factors):
+    """
+    Reconstrói de uma vez imagens PCA do mesmo formato: os coeficientes e
+    componentes são completados com zeros até o maior número de componentes e
+    multiplicados em um único matmul (N × H × k por N × k × W), com o corte em 0-255
+    feito no próprio resultado. Volumes multiframe entram com todos os quadros
+    empilhados nas linhas.
+    """
+    n_components = max(components.shape[0] for _, components, _ in factors)
+    shape = factors[0][0].shape[:-1] + factors[0][1].shape[1:]
+    rows = int(np.prod(shape[:-1]))
+    columns = shape[-1]
+    dtype = np.result_type(*factors[0])
+
+    coefficients = np.zeros((len(factors), rows, n_components), dtype)
+    components = np.zeros((len(factors), n_components, columns), dtype)
+    means = np.empty((len(factors), 1, columns), dtype)
+    for i, (compressed_image, principal_components, mean) in enumerate(factors):
+        coefficients[i, :, : compressed_image.shape[-1]] = compressed_image.reshape(
+            rows, -1
+        )
+        components[i, : principal_components.shape[0]] = principal_components
+        means[i, 0] = mean
+
+    images = np.matmul(coefficients, components)
+    images += means
+    np.rint(images, out=images)
+    np.clip(images, 0, 255, out=images)
+    return images.astype(np.uint8).reshape((len(factors),) + shape)
+
+
+def decode_pca_batch(paths, cache=None, batch_size=16):
+    """
+    Reconstrói uma lista de arquivos PCA e retorna as imagens uint8 na mesma ordem.
+    As imagens presentes no cache são reaproveitadas; as demais são agrupadas pelo
+    formato (H × W) e reconstruídas em lotes de até batch_size imagens. NPZ por
+    blocos e por fatias são reconstruídos um a um.
+    """
+    images = [None] * len(paths)
+    keys = [DecodeCache.key(path) for path in paths] if cache is not None else None
+
+    groups = defaultdict(list)
+    for i, path in enumerate(paths):
+        if cache is not None:
+            images[i] = cache.get(keys[i])
+            if images[i] is not None:
+                continue
+
+        factors = read_pca_factors(path)
+        if factors is None:
+            images[i] = reconstruct_npz_region(path)
+            continue
+
+        # Agrupa pelo formato da imagem e pela precisão dos arrays
+        compressed_image, principal_components, _ = factors
+        key = (
+            compressed_image.shape[:-1] + principal_components.shape[1:],
+            np.result_type(*factors),
+        )
+        groups[key].append((i, factors))
+
+    for group in groups.values():
+        for start in range(0, len(group), batch_size):
+            batch = group[start : start + batch_size]
+            for (i, _), image in zip(
+                batch, reconstruct_batch([factors for _, factors in batch])
+            ):
+                images[i] = image
+
+    if cache is not None:
+        for key, image in zip(keys, images):
+            cache.put(key, image)
+    return images
+
+
+def parse_range(text):
+    """Converte "INÍCIO:FIM" (limites opcionais, como em Python) em um slice."""
+    start, _, stop = text.partition(":")
+    return slice(int(start) if start else None, int(stop) if stop else None)
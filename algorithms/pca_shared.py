@@ -0,0 +1,601 @@
+import io
+import os
+import hashlib
+import argparse
+from collections import defaultdict
+from functools import lru_cache, partial
+from itertools import islice
+import numpy as np
+from sklearn.decomposition import PCA, IncrementalPCA
+from dicom_header import read_dicom_header
+from dicom_index import infer_organ
+from dicom_utils import (
+    add_index_argument,
+    add_metrics_argument,
+    calculate_compression_rate,
+    frame_file_name,
+    iter_dicom_files,
+    iter_dicom_frames,
+    iter_dicom_images,
+    normalize_pixel_array,
+    result_file_name,
+    summarize_results,
+)
+from manifest import Manifest, add_manifest_arguments, run_with_manifest
+from metrics import calculate_metrics
+from parallel import add_workers_argument
+from timing import StageTimer, add_timing_argument, start_timing_log, summarize_timings
+from write_result_csv import ResultsWriter, compact_results
+
+GROUP_BY = ["organ", "series"]
+
+
+def basis_file_name(group, rows, columns):
+    """Nome do arquivo da base compartilhada de um grupo (órgão ou série e resolução)."""
+    return f"basis-{group or 'all'}-{columns}x{rows}.npz"
+
+
+def file_basis_name(dicom_path, group_by="organ"):
+    """
+    Nome da base de um arquivo DICOM, lendo só o cabeçalho: o grupo é o órgão
+    (inferido do caminho) ou a série (SeriesInstanceUID).
+    """
+    header = read_dicom_header(dicom_path)
+    if group_by == "series":
+        group = header["series_instance_uid"]
+    else:
+        group = infer_organ(os.path.abspath(dicom_path))
+    return basis_file_name(group, header["rows"], header["columns"])
+
+
+def learn_basis(dicom_paths, variance_ratio, max_images=None):
+    """
+    Aprende uma base PCA comum às imagens informadas (até max_images quadros, lidos
+    um a um), usando as linhas de todas elas como amostras, e retorna (componentes
+    principais, média, variância explicada).
+    """
+    rows = np.concatenate(
+        [
+            image.astype(np.float32)
+            for image in islice(iter_dicom_images(dicom_paths), max_images)
+        ]
+    )
+
+    # Matriz alta (imagens × linhas, colunas): a covariância é mais barata que o SVD
+    pca = PCA(variance_ratio, svd_solver="covariance_eigh")
+    pca.fit(rows)
+    return pca.components_, pca.mean_, float(pca.explained_variance_ratio_.sum())
+
+
+def iter_slice_batches(dicom_paths, batch_size):
+    """
+    Fatias (quadros, em objetos multiframe) de batch_size imagens por vez, cada
+    uma achatada em uma linha de uma única matriz.
+    """
+    images = iter_dicom_images(dicom_paths)
+    while batch := list(islice(images, batch_size)):
+        yield np.stack([image.reshape(-1) for image in batch]).astype(np.float32)
+
+
+def learn_slice_basis(dicom_paths, variance_ratio, batch_size=32, max_components=64):
+    """
+    Aprende a base PCA de uma série usando cada fatia inteira como amostra, com
+    IncrementalPCA lendo batch_size fatias por vez (a memória não depende do
+    tamanho da série). Como fatias vizinhas são muito parecidas, poucos
+    componentes (no máximo max_components) bastam e cada fatia guarda só k
+    coeficientes. Retorna (componentes principais, média, variância explicada)
+    com os componentes necessários para variance_ratio.
+    """
+    # Cada lote precisa ter ao menos tantas fatias quanto os componentes
+    batches = iter_slice_batches(dicom_paths, max(batch_size, max_components))
+    pending = next(batches)
+    if len(pending) < 2:
+        # Uma única fatia é reconstruída pela média, sem componentes
+        return np.zeros((0, pending.shape[1]), np.float16), pending[0], 1.0
+
+    # Todo lote ajustado precisa ter ao menos n_components fatias: o último lote,
+    # se incompleto, é juntado ao anterior
+    pca = IncrementalPCA(n_components=min(max_components, len(pending)))
+    for slices in batches:
+        if len(slices) < len(pending):
+            pending = np.concatenate([pending, slices])
+            continue
+        pca.partial_fit(pending)
+        pending = slices
+    pca.partial_fit(pending)
+
+    ratio_cumsum = np.cumsum(np.nan_to_num(pca.explained_variance_ratio_))
+    n_components = min(
+        np.searchsorted(ratio_cumsum, variance_ratio, side="right") + 1,
+        len(pca.components_),
+    )
+    # Os componentes têm norma 1: em float16 a base ocupa metade, com erro
+    # desprezível na reconstrução
+    return (
+        pca.components_[:n_components].astype(np.float16),
+        pca.mean_.astype(np.float32),
+        float(ratio_cumsum[n_components - 1]),
+    )
+
+
+def save_basis(
+    basis_path,
+    principal_components,
+    mean,
+    variance_ratio,
+    train_files,
+    image_shape=(),
+    explained_variance=None,
+):
+    """
+    Salva a base; image_shape (linhas, colunas) identifica uma base por fatias e
+    explained_variance é a variância de fato explicada pelos componentes.
+    """
+    np.savez(
+        basis_path,
+        principal_components=principal_components,
+        mean=mean,
+        variance_ratio=variance_ratio,
+        explained_variance=(
+            variance_ratio if explained_variance is None else explained_variance
+        ),
+        train_files=np.array(train_files),
+        image_shape=np.array(image_shape, dtype=np.int64),
+    )
+
+
+@lru_cache(maxsize=32)
+def load_basis(basis_path):
+    """
+    Carrega (componentes principais, média, formato da fatia) de uma base, uma vez
+    por processo. O formato é None nas bases por linhas.
+    """
+    with np.load(basis_path) as npz:
+        image_shape = npz["image_shape"] if "image_shape" in npz else ()
+        return (
+            npz["principal_components"],
+            npz["mean"],
+            tuple(int(size) for size in image_shape) or None,
+        )
+
+
+def encode_shared_pca(pixel_array, principal_components, mean, basis_name, image_shape):
+    """
+    Projeta a imagem na base compartilhada e retorna os bytes do NPZ (só
+    coeficientes): um vetor por linha da imagem, ou k coeficientes para a fatia
+    inteira em uma base por fatias.
+    """
+    if image_shape is not None:
+        # Base por fatias: a imagem inteira é uma única amostra
+        compatible = pixel_array.shape == image_shape
+        samples = pixel_array.reshape(-1)
+    else:
+        compatible = pixel_array.shape[-1] == principal_components.shape[1]
+        samples = pixel_array
+    if not compatible:
+        raise ValueError(
+            f"Imagem {pixel_array.shape} incompatível com a base {basis_name}"
+        )
+
+    compressed_image = (samples.astype(np.float32) - mean) @ principal_components.T
+
+    buffer = io.BytesIO()
+    np.savez(buffer, compressed_image=compressed_image, basis=basis_name)
+    return buffer.getvalue()
+
+
+def reconstruct_slice_region(
+    compressed_image,
+    principal_components,
+    mean,
+    image_shape,
+    rows=slice(None),
+    columns=slice(None),
+):
+    """Reconstrói a região (rows, columns) de uma fatia codificada em uma base por fatias."""
+    components = principal_components.reshape(-1, *image_shape)[:, rows, columns]
+    region = (
+        np.tensordot(compressed_image, components, 1)
+        + mean.reshape(image_shape)[rows, columns]
+    )
+    return np.clip(np.rint(region), 0, 255).astype(np.uint8)
+
+
+def decode_shared_pca(data, basis_dir):
+    """Reconstrói a imagem uint8 a partir dos bytes do NPZ e da base em basis_dir."""
+    npz = np.load(io.BytesIO(data))
+    principal_components, mean, image_shape = load_basis(
+        os.path.join(basis_dir, str(npz["basis"]))
+    )
+    if image_shape is not None:
+        return reconstruct_slice_region(
+            npz["compressed_image"], principal_components, mean, image_shape
+        )
+
+    reconstructed_image = np.dot(npz["compressed_image"], principal_components) + mean
+    return np.clip(np.rint(reconstructed_image), 0, 255).astype(np.uint8)
+
+
+def compress_shared_pca_file(
+    subdir,
+    file,
+    output_dir,
+    group_by,
+    method,
+    compute_metrics=False,
+    timing_path=None,
+):
+    """
+    Projeta um arquivo DICOM na base do seu grupo (resolvida pelo cabeçalho, no
+    próprio processo) e retorna o resultado. Objetos
+    multiframe são lidos quadro a quadro, com um NPZ ('<arquivo>_f0001.npz') e um
+    resultado por quadro, retornados em lista.
+    """
+    dicom_path = os.path.join(subdir, file)
+    timer = StageTimer(timing_path, file=dicom_path, method=method)
+    results = []
+
+    try:
+        with timer.stage("header"):
+            basis_name = file_basis_name(dicom_path, group_by)
+        principal_components, mean, image_shape = load_basis(
+            os.path.join(output_dir, basis_name)
+        )
+
+        with timer.stage("getsize"):
+            file_size = os.path.getsize(dicom_path)  # bytes
+        timer.add_bytes("input", file_size)
+
+        # Carrega cada quadro do DICOM e normaliza os pixels para 0-255
+        for frame, n_frames, pixel_array in timer.iter_stage(
+            "dcmread", iter_dicom_frames(dicom_path)
+        ):
+            with timer.stage("normalize"):
+                pixel_array = normalize_pixel_array(pixel_array)
+
+            # Verifica se a imagem é grayscale
+            if len(pixel_array.shape) != 2:
+                raise ValueError("A imagem DICOM não é grayscale.")
+
+            # Define o nome do arquivo NPZ
+            npz_path = os.path.join(output_dir, frame_file_name(file, frame, ".npz"))
+
+            # Projeta na base compartilhada (uma multiplicação de matrizes) e salva
+            with timer.stage("encode"):
+                data = encode_shared_pca(
+                    pixel_array, principal_components, mean, basis_name, image_shape
+                )
+            with timer.stage("write"):
+                with open(npz_path, "wb") as npz_file:
+                    npz_file.write(data)
+
+            # Armazena os tamanhos dos arquivos
+            with timer.stage("getsize"):
+                original_size = file_size // n_frames  # bytes (fração do quadro)
+                converted_size = os.path.getsize(npz_path)  # bytes
+            timer.add_bytes("output", converted_size)
+
+            result = {
+                "file_name": result_file_name(subdir, file, frame),
+                "method": method,
+                "original_size": original_size,
+                "converted_size": converted_size,
+                "output_path": npz_path,
+                "compression_rate": calculate_compression_rate(
+                    original_size, converted_size
+                ),
+            }
+
+            # Decodifica o NPZ em memória e calcula MSE e PSNR
+            if compute_metrics:
+                with timer.stage("metrics"):
+                    result.update(
+                        calculate_metrics(
+                            pixel_array, decode_shared_pca(data, output_dir)
+                        )
+                    )
+
+            results.append(result)
+
+        return results if frame is not None else results[0]
+
+    except Exception as e:
+        print(f"Erro ao converter {dicom_path}: {e}")
+        return None
+
+    finally:
+        timer.write()
+
+
+def prepare_bases(
+    input_dir,
+    output_dir,
+    variance_ratio,
+    train_images,
+    force=False,
+    index_path=None,
+    group_by="organ",
+    batch_size=32,
+    max_components=64,
+):
+    """
+    Agrupa os arquivos por órgão (ou série) e resolução, lendo só o cabeçalho, e
+    aprende a base de cada grupo que ainda não existe em output_dir. Por órgão, a
+    base (por linhas) vem de uma amostra de até train_images arquivos; por série,
+    a base (por fatias, com até max_components componentes) vem de todas as
+    fatias, com IncrementalPCA em lotes de batch_size. Retorna o nome da base de
+    cada arquivo.
+    """
+    groups = defaultdict(list)
+    for subdir, file in iter_dicom_files(input_dir, index_path):
+        dicom_path = os.path.join(subdir, file)
+        try:
+            basis_name = file_basis_name(dicom_path, group_by)
+        except Exception as e:
+            print(f"Erro ao processar {dicom_path}: {e}")
+            continue
+        groups[basis_name].append(dicom_path)
+
+    rng = np.random.default_rng(0)
+    for basis_name, dicom_paths in groups.items():
+        basis_path = os.path.join(output_dir, basis_name)
+        # Bases por linhas de versões anteriores do modo série são aprendidas de novo
+        if (
+            os.path.exists(basis_path)
+            and not force
+            and (group_by != "series" or load_basis(basis_path)[2] is not None)
+        ):
+            continue
+
+        image_shape = ()
+        if group_by == "series":
+            sample = sorted(dicom_paths)
+            header = read_dicom_header(sample[0])
+            image_shape = (header["rows"], header["columns"])
+            principal_components, mean, explained_variance = learn_slice_basis(
+                sample, variance_ratio, batch_size, max_components
+            )
+        else:
+            sample = sorted(
+                rng.choice(
+                    dicom_paths, min(train_images, len(dicom_paths)), replace=False
+                ).tolist()
+            )
+            principal_components, mean, explained_variance = learn_basis(
+                sample, variance_ratio, train_images
+            )
+        save_basis(
+            basis_path,
+            principal_components,
+            mean,
+            variance_ratio,
+            sample,
+            image_shape,
+            explained_variance,
+        )
+        load_basis.cache_clear()
+        print(
+            f"Base {basis_name}: {principal_components.shape[0]} componentes "
+            f"aprendidos de {len(sample)} imagens "
+            f"({explained_variance:.2%} da variância)"
+        )
+        if explained_variance < variance_ratio:
+            print(
+                f"Aviso: a base {basis_name} não alcança {variance_ratio:.2%} da "
+                f"variância com {principal_components.shape[0]} componentes "
+                "(aumente --max-components)"
+            )
+
+    return {
+        dicom_path: basis_name
+        for basis_name, dicom_paths in groups.items()
+        for dicom_path in dicom_paths
+    }
+
+
+def explained_variances(output_dir, basis_names):
+    """Variância de fato explicada por cada base (a pedida, nas bases antigas)."""
+    variances = {}
+    for basis_name in sorted(set(basis_names)):
+        with np.load(os.path.join(output_dir, basis_name)) as npz:
+            key = (
+                "explained_variance"
+                if "explained_variance" in npz
+                else "variance_ratio"
+            )
+            variances[basis_name] = float(npz[key])
+    return variances
+
+
+def basis_fingerprints(output_dir, basis_names):
+    """
+    Hash de cada base, registrado no manifesto de cada arquivo para reconverter só
+    os arquivos cuja base mudou.
+    """
+    fingerprints = {}
+    for basis_name in sorted(set(basis_names)):
+        with open(os.path.join(output_dir, basis_name), "rb") as file:
+            fingerprints[basis_name] = hashlib.sha256(file.read()).hexdigest()
+    return fingerprints
+
+
+def convert_dicom_to_shared_pca(
+    input_dir,
+    variance_ratio,
+    train_images=64,
+    workers=1,
+    force=False,
+    use_hash=False,
+    compute_metrics=False,
+    index_path=None,
+    timing_path=None,
+    group_by="organ",
+    batch_size=32,
+    max_components=64,
+):
+    """
+    Converte arquivos DICOM em NPZ que guardam apenas os coeficientes da projeção
+    em uma base PCA compartilhada por órgão (ou série) e resolução, salva uma
+    única vez no diretório de saída. Por série, cada fatia guarda só k
+    coeficientes da base aprendida com as fatias da série.
+    """
+    mode = "SERIES" if group_by == "series" else "SHARED"
+    method = f"PCA-{mode}-{int(variance_ratio * 1000)}"
+    output_dir = (
+        f"{input_dir}-pca-{mode.lower()}-compressed-{int(variance_ratio * 1000)}"
+    )
+    os.makedirs(output_dir, exist_ok=True)
+
+    start_timing_log(timing_path)
+    run_timer = StageTimer(timing_path, file=None, method=method)
+
+    # Aprende (ou reaproveita) a base de cada grupo
+    with run_timer.stage("learn_basis"):
+        bases = prepare_bases(
+            input_dir,
+            output_dir,
+            variance_ratio,
+            train_images,
+            force,
+            index_path,
+            group_by,
+            batch_size,
+            max_components,
+        )
+
+    results = []
+    fingerprints = basis_fingerprints(output_dir, bases.values())
+
+    def basis_params(dicom_path):
+        basis_name = bases.get(dicom_path)
+        return {"basis": basis_name, "sha256": fingerprints.get(basis_name)}
+
+    # Manifesto das conversões já realizadas (execuções incrementais); cada entrada
+    # guarda o hash da base do próprio arquivo
+    manifest = Manifest(
+        input_dir,
+        output_dir,
+        method,
+        params={"variance_ratio": variance_ratio},
+        file_params=basis_params,
+        use_hash=use_hash,
+        force=force,
+        required_fields=("mse", "psnr") if compute_metrics else (),
+    )
+
+    # Percorre todos os arquivos no diretório de entrada
+    with manifest, ResultsWriter() as writer:
+        for result in run_with_manifest(
+            partial(
+                compress_shared_pca_file,
+                output_dir=output_dir,
+                group_by=group_by,
+                method=method,
+                compute_metrics=compute_metrics,
+                timing_path=timing_path,
+            ),
+            input_dir,
+            workers,
+            manifest,
+            index_path,
+        ):
+            if result is None:
+                continue
+
+            results.append(result)
+            writer.add_result(result)
+
+    # Monta o CSV largo a partir dos resultados acumulados
+    with run_timer.stage("csv_rewrite"):
+        compact_results()
+
+    summarize_results(results, f"{output_dir}.txt")
+
+    # As bases são gravadas uma única vez e não entram na taxa de cada arquivo
+    basis_size = sum(
+        os.path.getsize(os.path.join(output_dir, basis_name))
+        for basis_name in set(bases.values())
+    )
+    print(
+        f"Bases compartilhadas: {len(set(bases.values()))} "
+        f"({basis_size / 1024:.2f} KB no total)"
+    )
+    variances = explained_variances(output_dir, bases.values())
+    if variances:
+        below = [name for name, ratio in variances.items() if ratio < variance_ratio]
+        print(
+            f"Variância explicada pelas bases: mínima {min(variances.values()):.2%}, "
+            f"{len(below)} abaixo de {variance_ratio:.2%}"
+        )
+    if results:
+        original_size = sum(result["original_size"] for result in results)
+        converted_size = sum(result["converted_size"] for result in results)
+        rate = calculate_compression_rate(original_size, converted_size + basis_size)
+        print(f"Taxa de compressão incluindo as bases: {rate:.2f}%")
+
+    if timing_path:
+        run_timer.write()
+        summarize_timings(timing_path)
+
+
+# Exemplo de uso
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Converter um diretório de imagens DICOM em coeficientes de uma base PCA compartilhada por órgão (ou série) e resolução."
+    )
+    parser.add_argument(
+        "input_dir",
+        type=str,
+        help="Caminho para o diretório de imagens DICOM de entrada",
+    )
+    parser.add_argument(
+        "variance_ratio",
+        type=float,
+        help="Quantidade de variância mantida pela base (entre 0 e 1)",
+    )
+    parser.add_argument(
+        "--train-images",
+        type=int,
+        default=64,
+        help="Quantidade de imagens sorteadas de cada grupo para aprender a base (bases já existentes são reaproveitadas; --force as aprende novamente)",
+    )
+    parser.add_argument(
+        "--group-by",
+        choices=GROUP_BY,
+        default="organ",
+        help="Agrupa as imagens por órgão (base por linhas aprendida de uma amostra) ou por série (SeriesInstanceUID; base por fatias aprendida de todas as fatias com IncrementalPCA, k coeficientes por fatia)",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=32,
+        help="Fatias lidas por vez ao aprender a base de uma série (limita a memória; o lote nunca é menor que --max-components)",
+    )
+    parser.add_argument(
+        "--max-components",
+        type=int,
+        default=64,
+        help="Máximo de componentes da base de uma série; se não bastarem para variance_ratio, a variância alcançada é informada",
+    )
+    add_workers_argument(parser)
+    add_manifest_arguments(parser)
+    add_index_argument(parser)
+    add_metrics_argument(parser)
+    add_timing_argument(parser)
+
+    args = parser.parse_args()
+    # Chama a função de conversão
+    convert_dicom_to_shared_pca(
+        args.input_dir,
+        args.variance_ratio,
+        args.train_images,
+        args.workers,
+        args.force,
+        args.hash,
+        args.metrics,
+        args.index,
+        args.timings,
+        args.group_by,
+        args.batch_size,
+        args.max_components,
+    )
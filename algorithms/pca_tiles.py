@@ -0,0 +1,141 @@
+import io
+import numpy as np
+from sklearn.decomposition import PCA
+
+TILE_SIZES = [4, 8, 16]
+
+
+def image_to_tiles(image, tile_size):
+    """
+    Divide a imagem em blocos tile_size×tile_size (replicando a borda quando as
+    dimensões não são múltiplas do bloco) e retorna uma matriz (blocos, pixels).
+    """
+    rows, columns = image.shape
+    padded = np.pad(
+        image,
+        ((0, -rows % tile_size), (0, -columns % tile_size)),
+        mode="edge",
+    )
+    tile_rows = padded.shape[0] // tile_size
+    tile_columns = padded.shape[1] // tile_size
+
+    tiles = padded.reshape(tile_rows, tile_size, tile_columns, tile_size)
+    return tiles.transpose(0, 2, 1, 3).reshape(-1, tile_size * tile_size)
+
+
+def tiles_to_image(tiles, tile_size, shape):
+    """Remonta a imagem a partir da matriz de blocos e remove o preenchimento."""
+    rows, columns = shape
+    tile_rows = -(-rows // tile_size)
+    tile_columns = -(-columns // tile_size)
+
+    image = tiles.reshape(tile_rows, tile_columns, tile_size, tile_size)
+    image = image.transpose(0, 2, 1, 3).reshape(
+        tile_rows * tile_size, tile_columns * tile_size
+    )
+    return image[:rows, :columns]
+
+
+def fit_tiles(pixel_array, tile_size):
+    """
+    Aprende a base PCA dos blocos da imagem e projeta todos os blocos de uma vez.
+    Retorna (coeficientes, componentes, média), com os coeficientes de cada bloco na
+    ordem dos componentes.
+    """
+    tiles = image_to_tiles(pixel_array.astype(np.float32), tile_size)
+
+    # Muitos blocos e poucas dimensões (tile_size²): a covariância é mais barata
+    pca = PCA(svd_solver="covariance_eigh")
+    coefficients = pca.fit_transform(tiles)
+    return coefficients, pca.components_, pca.mean_
+
+
+def tile_component_counts(coefficients, variance_ratio):
+    """
+    Número de componentes mantidos em cada bloco. O erro permitido na imagem,
+    (1 - variance_ratio) da variância total, é dividido igualmente entre os blocos;
+    cada bloco mantém os primeiros componentes até que o erro restante caiba na sua
+    parte.
+    """
+    energy = coefficients.astype(np.float64) ** 2
+    total_energy = energy.sum(axis=1)
+    budget = (1 - variance_ratio) * total_energy.sum() / len(coefficients)
+
+    # Erro restante após manter k componentes, para k = 0 .. n-1
+    residual = total_energy[:, None] - np.cumsum(energy, axis=1)
+    residual = np.concatenate([total_energy[:, None], residual[:, :-1]], axis=1)
+    return (residual > budget).sum(axis=1)
+
+
+def serialize_tiles(tile_fit, variance_ratio, shape, tile_size):
+    """Salva em NPZ os componentes mantidos em cada bloco e retorna os bytes."""
+    coefficients, principal_components, mean = tile_fit
+    counts = tile_component_counts(coefficients, variance_ratio)
+    kept = np.arange(coefficients.shape[1]) < counts[:, None]
+    count_dtype = np.uint8 if coefficients.shape[1] < 256 else np.uint16
+
+    buffer = io.BytesIO()
+    np.savez(
+        buffer,
+        tile_size=tile_size,
+        shape=np.array(shape),
+        component_counts=counts.astype(count_dtype),
+        coefficients=coefficients[kept],
+        principal_components=principal_components[: counts.max(initial=0)],
+        mean=mean,
+    )
+    return buffer.getvalue()
+
+
+def is_tile_npz(npz):
+    return "tile_size" in npz.files
+
+
+def reconstruct_tiles(npz):
+    """Reconstrói a imagem uint8 a partir dos arrays de um NPZ por blocos."""
+    return reconstruct_tile_region(npz, slice(None), slice(None))
+
+
+def reconstruct_tile_region(arrays, rows, columns):
+    """
+    Reconstrói apenas as linhas e colunas pedidas (slices) de uma imagem por
+    blocos, projetando de volta só os blocos que as cobrem. arrays pode ser um NPZ
+    ou um dicionário de arrays mapeados em memória.
+    """
+    tile_size = int(arrays["tile_size"])
+    shape = tuple(int(size) for size in arrays["shape"])
+    row_start, row_stop, _ = rows.indices(shape[0])
+    column_start, column_stop, _ = columns.indices(shape[1])
+
+    # Blocos que cobrem a região e a posição dos seus coeficientes no array achatado
+    tile_rows = range(row_start // tile_size, -(-row_stop // tile_size))
+    tile_columns = range(column_start // tile_size, -(-column_stop // tile_size))
+    tiles_per_row = -(-shape[1] // tile_size)
+    index = (
+        np.array(tile_rows)[:, None] * tiles_per_row + np.array(tile_columns)
+    ).ravel()
+
+    counts = np.asarray(arrays["component_counts"], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(counts)])[index]
+    counts = counts[index]
+
+    # Recoloca os coeficientes mantidos (os demais são zero) e projeta de volta
+    principal_components = np.asarray(arrays["principal_components"])
+    kept = np.arange(len(principal_components)) < counts[:, None]
+    coefficients = np.zeros(kept.shape, np.float32)
+    coefficients[kept] = arrays["coefficients"][
+        (offsets[:, None] + np.arange(kept.shape[1]))[kept]
+    ]
+    tiles = coefficients @ principal_components + np.asarray(arrays["mean"])
+
+    image = tiles_to_image(
+        tiles,
+        tile_size,
+        (len(tile_rows) * tile_size, len(tile_columns) * tile_size),
+    )
+    top = tile_rows.start * tile_size
+    left = tile_columns.start * tile_size
+    image = image[
+        row_start - top : row_stop - top, column_start - left : column_stop - left
+    ]
+    return np.clip(np.rint(image), 0, 255).astype(np.uint8)
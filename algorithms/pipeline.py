@@ -0,0 +1,283 @@
+import os
+import argparse
+from contextlib import ExitStack
+from functools import partial
+from dicom_utils import (
+    add_index_argument,
+    calculate_compression_rate,
+    frame_file_name,
+    iter_dicom_frames,
+    normalize_pixel_array,
+    result_file_name,
+    summarize_results,
+)
+from manifest import Manifest, add_manifest_arguments, run_with_manifests
+from parallel import add_workers_argument
+from png import encode_png, decode_png
+from jpeg import encode_jpeg, decode_jpeg
+from pca import (
+    add_container_arguments,
+    add_svd_solver_argument,
+    container_from_args,
+    decode_pca,
+    encode_pca,
+    encode_pca_multi,
+    pca_extension,
+    pca_method,
+    pca_params,
+    pca_suffix,
+)
+from metrics import calculate_metrics
+from timing import StageTimer, add_timing_argument, start_timing_log, summarize_timings
+from write_result_csv import ResultsWriter, compact_results
+
+
+def build_codecs(variance_ratios, svd_solver="full", container=None):
+    """Monta a lista de codecs (PNG, JPEG e uma variante PCA por variância)."""
+    codecs = [
+        {
+            "method": "PNG",
+            "suffix": "-png-compressed",
+            "extension": ".png",
+            "params": {},
+            "encode": encode_png,
+            "decode": decode_png,
+        },
+        {
+            "method": "JPEG",
+            "suffix": "-jpeg-compressed",
+            "extension": ".jpeg",
+            "params": {},
+            "encode": encode_jpeg,
+            "decode": decode_jpeg,
+        },
+    ]
+    for variance_ratio in variance_ratios:
+        codecs.append(
+            {
+                "method": pca_method(variance_ratio, container),
+                "suffix": pca_suffix(variance_ratio, container),
+                "extension": pca_extension(container),
+                "params": pca_params(variance_ratio, svd_solver, container),
+                "encode": partial(
+                    encode_pca,
+                    variance_ratio=variance_ratio,
+                    svd_solver=svd_solver,
+                    container=container,
+                ),
+                "decode": decode_pca,
+            }
+        )
+    return codecs
+
+
+def process_frame(subdir, file, frame, original_size, pixel_array, codecs, timer):
+    """
+    Comprime uma imagem (ou um quadro) já normalizada com os codecs e retorna um
+    resultado por codec. As variantes PCA são geradas a partir de uma única
+    decomposição.
+    """
+    results = []
+    dicom_path = os.path.join(subdir, file)
+
+    # Decompõe a imagem uma única vez para todas as variantes PCA pendentes
+    encoded = {}
+    pca_codecs = [codec for codec in codecs if "variance_ratio" in codec["params"]]
+    if pca_codecs:
+        try:
+            with timer.stage("PCA:encode"):
+                all_data = encode_pca_multi(
+                    pixel_array,
+                    [codec["params"]["variance_ratio"] for codec in pca_codecs],
+                    pca_codecs[0]["params"].get("svd_solver", "full"),
+                    pca_codecs[0]["params"].get("container"),
+                )
+            for codec, data in zip(pca_codecs, all_data):
+                encoded[codec["method"]] = data
+        except Exception as e:
+            print(f"Erro ao converter {dicom_path} (PCA): {e}")
+            codecs = [codec for codec in codecs if codec not in pca_codecs]
+
+    for codec in codecs:
+        try:
+            # Codifica a imagem e salva o arquivo comprimido
+            if codec["method"] in encoded:
+                data = encoded[codec["method"]]
+            else:
+                with timer.stage(f"{codec['method']}:encode"):
+                    data = codec["encode"](pixel_array)
+            output_filename = frame_file_name(file, frame, codec["extension"])
+            output_path = os.path.join(codec["output_dir"], output_filename)
+            with timer.stage(f"{codec['method']}:write"):
+                with open(output_path, "wb") as f:
+                    f.write(data)
+
+            converted_size = len(data)  # bytes
+            timer.add_bytes(f"{codec['method']}:output", converted_size)
+
+            result = {
+                "file_name": result_file_name(subdir, file, frame),
+                "method": codec["method"],
+                "original_size": original_size,
+                "converted_size": converted_size,
+                "output_path": output_path,
+                "compression_rate": calculate_compression_rate(
+                    original_size, converted_size
+                ),
+            }
+
+            # Decodifica os bytes em memória para calcular MSE e PSNR
+            with timer.stage(f"{codec['method']}:metrics"):
+                result.update(calculate_metrics(pixel_array, codec["decode"](data)))
+            results.append(result)
+
+        except Exception as e:
+            print(f"Erro ao converter {dicom_path} ({codec['method']}): {e}")
+
+    return results
+
+
+def process_file(subdir, file, methods, codecs, timing_path=None):
+    """
+    Lê e normaliza um DICOM uma única vez e o comprime com os codecs pendentes
+    (methods), retornando um resultado (tamanhos, taxa, MSE e PSNR) por codec.
+    Objetos multiframe são lidos quadro a quadro, com uma saída
+    ('<arquivo>_f0001<extensão>') e um resultado por quadro e codec.
+    """
+    dicom_path = os.path.join(subdir, file)
+    codecs = [codec for codec in codecs if codec["method"] in methods]
+    results = []
+    timer = StageTimer(timing_path, file=dicom_path)
+
+    try:
+        with timer.stage("getsize"):
+            file_size = os.path.getsize(dicom_path)  # bytes
+        timer.add_bytes("input", file_size)
+
+        # Carrega cada quadro e normaliza os pixels uma única vez para os codecs
+        for frame, n_frames, pixel_array in timer.iter_stage(
+            "dcmread", iter_dicom_frames(dicom_path)
+        ):
+            with timer.stage("normalize"):
+                pixel_array = normalize_pixel_array(pixel_array)
+            results.extend(
+                process_frame(
+                    subdir,
+                    file,
+                    frame,
+                    file_size // n_frames,
+                    pixel_array,
+                    codecs,
+                    timer,
+                )
+            )
+    except Exception as e:
+        print(f"Erro ao ler {dicom_path}: {e}")
+        results = []
+
+    timer.write()
+    return results
+
+
+def run_pipeline(
+    input_dir,
+    variance_ratios,
+    workers=1,
+    force=False,
+    use_hash=False,
+    index_path=None,
+    timing_path=None,
+    svd_solver="full",
+    container=None,
+):
+    """
+    Lê e normaliza cada DICOM uma única vez e distribui a matriz uint8 para todos
+    os codecs, gravando as saídas, as taxas de compressão e o MSE/PSNR.
+    """
+    codecs = build_codecs(variance_ratios, svd_solver, container)
+    start_timing_log(timing_path)
+    run_timer = StageTimer(timing_path, file=None)
+
+    # Cria os diretórios de saída e o manifesto de cada codec
+    manifests = {}
+    for codec in codecs:
+        codec["output_dir"] = input_dir + codec["suffix"]
+        os.makedirs(codec["output_dir"], exist_ok=True)
+        manifests[codec["method"]] = Manifest(
+            input_dir,
+            codec["output_dir"],
+            codec["method"],
+            params=codec["params"],
+            use_hash=use_hash,
+            force=force,
+            required_fields=("mse", "psnr"),
+        )
+
+    results_by_method = {codec["method"]: [] for codec in codecs}
+
+    with ExitStack() as stack, ResultsWriter() as writer:
+        for manifest in manifests.values():
+            stack.enter_context(manifest)
+
+        # Converte, para cada arquivo, os codecs cuja entrada no manifesto não está atual
+        for result in run_with_manifests(
+            partial(process_file, codecs=codecs, timing_path=timing_path),
+            input_dir,
+            workers,
+            manifests,
+            index_path,
+        ):
+            results_by_method[result["method"]].append(result)
+            writer.add_result(result)
+
+    # Monta o CSV largo (taxas, MSE e PSNR) a partir dos resultados acumulados
+    with run_timer.stage("csv_rewrite"):
+        compact_results()
+
+    for codec in codecs:
+        print(f"\n{codec['method']}:")
+        summarize_results(
+            results_by_method[codec["method"]], f"{input_dir}{codec['suffix']}.txt"
+        )
+
+    if timing_path:
+        run_timer.write()
+        summarize_timings(timing_path)
+
+
+# Exemplo de uso
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Comprime um diretório de imagens DICOM com PNG, JPEG e PCA lendo cada arquivo uma única vez."
+    )
+    parser.add_argument(
+        "input_dir",
+        type=str,
+        help="Caminho para o diretório de imagens DICOM de entrada",
+    )
+    parser.add_argument(
+        "--variance-ratios",
+        type=float,
+        nargs="+",
+        default=[0.95, 0.975, 0.99],
+        help="Variâncias mantidas pelas variantes PCA (entre 0 e 1)",
+    )
+    add_workers_argument(parser)
+    add_manifest_arguments(parser)
+    add_index_argument(parser)
+    add_timing_argument(parser)
+    add_svd_solver_argument(parser)
+    add_container_arguments(parser)
+
+    args = parser.parse_args()
+    run_pipeline(
+        args.input_dir,
+        args.variance_ratios,
+        args.workers,
+        args.force,
+        args.hash,
+        args.index,
+        args.timings,
+        args.svd_solver,
+        container_from_args(args),
+    )
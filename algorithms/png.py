@@ -1,101 +1,376 @@
+import io
 import os
-import pydicom
+import json
+import time
+import argparse
+from functools import partial
+from itertools import islice
 from PIL import Image
 import numpy as np
-from write_result_csv import update_compression_csv
+from dicom_utils import (
+    add_dry_run_argument,
+    add_index_argument,
+    add_metrics_argument,
+    calculate_compression_rate,
+    frame_file_name,
+    iter_dicom_files,
+    iter_dicom_frames,
+    iter_dicom_images,
+    normalize_pixel_array,
+    result_file_name,
+    summarize_results,
+)
+from manifest import Manifest, add_manifest_arguments, run_with_manifest
+from metrics import calculate_metrics
+from parallel import add_workers_argument
+from timing import StageTimer, add_timing_argument, start_timing_log, summarize_timings
+from write_result_csv import ResultsWriter, compact_results
 
+# Estratégias do zlib aceitas pelo Pillow (compress_type)
+PNG_STRATEGIES = {
+    "default": Image.DEFAULT_STRATEGY,
+    "filtered": Image.FILTERED,
+    "huffman": Image.HUFFMAN_ONLY,
+    "rle": Image.RLE,
+    "fixed": Image.FIXED,
+}
 
-def convert_dicom_to_png(input_dir):
-    # Cria o diretório de saída com sufixo '-png-compressed'
+# Pontos da fronteira de Pareto usados por --preset
+PNG_PRESETS = ["archival", "fast"]
+
+
+def encode_png(pixel_array, **options):
+    """
+    Codifica uma matriz uint8 como PNG e retorna os bytes. options são repassadas
+    ao Pillow (compress_level, optimize, compress_type); sem elas, o padrão do Pillow.
+    """
+    # Converte a matriz de pixels em uma imagem Pillow
+    image = Image.fromarray(pixel_array)
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG", **options)
+    return buffer.getvalue()
+
+
+def decode_png(data):
+    """Decodifica os bytes de um PNG em uma matriz uint8 em escala de cinza."""
+    return np.array(Image.open(io.BytesIO(data)).convert("L"), dtype=np.uint8)
+
+
+def png_settings():
+    """
+    Combinações avaliadas pela varredura: compress_level 0-9 com cada estratégia do
+    zlib e optimize com cada estratégia (optimize fixa o nível em 9 no Pillow, então
+    o nível não é variado com ele).
+    """
+    for strategy, compress_type in PNG_STRATEGIES.items():
+        for compress_level in range(10):
+            yield {"compress_level": compress_level, "compress_type": compress_type}
+        yield {"optimize": True, "compress_type": compress_type}
+
+
+def setting_name(options):
+    strategy = {value: name for name, value in PNG_STRATEGIES.items()}[
+        options.get("compress_type", Image.DEFAULT_STRATEGY)
+    ]
+    if options.get("optimize"):
+        return f"optimize-{strategy}"
+    return f"level{options.get('compress_level', 6)}-{strategy}"
+
+
+def pareto_front(measurements):
+    """Configurações não dominadas em tempo de codificação e tamanho."""
+    front = []
+    smallest = float("inf")
+    for measurement in sorted(measurements, key=lambda m: (m["encode_ms"], m["bytes"])):
+        if measurement["bytes"] < smallest:
+            front.append(measurement)
+            smallest = measurement["bytes"]
+    return front
+
+
+def sweep_png(input_dir, report_path, sample_size=32, index_path=None, seed=0):
+    """
+    Codifica (em memória) uma amostra de sample_size imagens (quadros, em objetos
+    multiframe) com cada combinação de png_settings, mede codificação,
+    decodificação (ms por imagem) e bytes, e salva em report_path as medições, a
+    fronteira de Pareto e os presets: 'archival' (menor tamanho) e 'fast'
+    (codificação mais rápida).
+    """
+    files = [
+        os.path.join(subdir, file)
+        for subdir, file in iter_dicom_files(input_dir, index_path)
+    ]
+    rng = np.random.default_rng(seed)
+    sample = sorted(
+        rng.choice(files, min(sample_size, len(files)), replace=False).tolist()
+    )
+    images = list(islice(iter_dicom_images(sample), sample_size))
+    if not images:
+        raise SystemExit(
+            f"Nenhuma imagem DICOM para a varredura em {input_dir} "
+            f"(--sample-size {sample_size})."
+        )
+
+    measurements = []
+    for options in png_settings():
+        encoded = []
+        start = time.perf_counter()
+        for image in images:
+            encoded.append(encode_png(image, **options))
+        encode_end = time.perf_counter()
+        for data in encoded:
+            decode_png(data)
+        decode_end = time.perf_counter()
+
+        measurements.append(
+            {
+                "name": setting_name(options),
+                "options": options,
+                "encode_ms": (encode_end - start) / len(images) * 1000,
+                "decode_ms": (decode_end - encode_end) / len(images) * 1000,
+                "bytes": sum(len(data) for data in encoded) / len(images),
+            }
+        )
+
+    front = pareto_front(measurements)
+    report = {
+        "input_dir": input_dir,
+        "sample": sample,
+        "measurements": measurements,
+        "pareto": [measurement["name"] for measurement in front],
+        "presets": {
+            "archival": min(front, key=lambda m: m["bytes"])["options"],
+            "fast": min(front, key=lambda m: m["encode_ms"])["options"],
+        },
+    }
+    with open(report_path, "w") as report_file:
+        json.dump(report, report_file, indent=2)
+
+    # Exibe a fronteira de Pareto
+    print(f"\nFronteira de Pareto ({len(images)} imagens, {report_path}):")
+    print(
+        f"{'CONFIGURAÇÃO':<20} {'CODIF. (ms)':>12} {'DECODIF. (ms)':>14} {'BYTES':>10}"
+    )
+    for measurement in front:
+        print(
+            f"{measurement['name']:<20} {measurement['encode_ms']:>12.2f} "
+            f"{measurement['decode_ms']:>14.2f} {measurement['bytes']:>10.0f}"
+        )
+    return report
+
+
+def load_png_preset(report_path, preset):
+    """Opções do Pillow do preset ('archival' ou 'fast') salvo por sweep_png."""
+    with open(report_path) as report_file:
+        return json.load(report_file)["presets"][preset]
+
+
+def compress_png_file(
+    subdir,
+    file,
+    output_dir,
+    compute_metrics=False,
+    timing_path=None,
+    options=None,
+    dry_run=False,
+):
+    """
+    Converte um arquivo DICOM em PNG e retorna o resultado da compressão. Objetos
+    multiframe são lidos quadro a quadro e geram um PNG ('<arquivo>_f0001.png') e
+    um resultado por quadro (retornados em lista), cada um com uma fração igual do
+    tamanho original. Com dry_run, o PNG fica só em memória e o tamanho é o do
+    buffer.
+    """
+    dicom_path = os.path.join(subdir, file)
+    timer = StageTimer(timing_path, file=dicom_path, method="PNG")
+    results = []
+
+    try:
+        with timer.stage("getsize"):
+            file_size = os.path.getsize(dicom_path)  # bytes
+        timer.add_bytes("input", file_size)
+
+        # Carrega cada quadro do DICOM e normaliza os pixels para 0-255
+        for frame, n_frames, pixel_array in timer.iter_stage(
+            "dcmread", iter_dicom_frames(dicom_path)
+        ):
+            with timer.stage("normalize"):
+                pixel_array = normalize_pixel_array(pixel_array)
+
+            # Define o nome do arquivo PNG
+            png_path = os.path.join(output_dir, frame_file_name(file, frame, ".png"))
+
+            # Salva a imagem como PNG
+            with timer.stage("encode"):
+                data = encode_png(pixel_array, **(options or {}))
+            if not dry_run:
+                with timer.stage("write"):
+                    with open(png_path, "wb") as png_file:
+                        png_file.write(data)
+
+            # Armazena os tamanhos dos arquivos
+            with timer.stage("getsize"):
+                original_size = file_size // n_frames  # bytes (fração do quadro)
+                converted_size = len(data) if dry_run else os.path.getsize(png_path)
+            timer.add_bytes("output", converted_size)
+
+            result = {
+                "file_name": result_file_name(subdir, file, frame),
+                "method": "PNG",
+                "original_size": original_size,
+                "converted_size": converted_size,
+                "output_path": None if dry_run else png_path,
+                "compression_rate": calculate_compression_rate(
+                    original_size, converted_size
+                ),
+            }
+
+            # Decodifica o PNG em memória e calcula MSE e PSNR
+            if compute_metrics:
+                with timer.stage("metrics"):
+                    result.update(calculate_metrics(pixel_array, decode_png(data)))
+
+            results.append(result)
+
+        return results if frame is not None else results[0]
+
+    except Exception as e:
+        print(f"Erro ao converter {dicom_path}: {e}")
+        return None
+
+    finally:
+        timer.write()
+
+
+def convert_dicom_to_png(
+    input_dir,
+    workers=1,
+    force=False,
+    use_hash=False,
+    compute_metrics=False,
+    index_path=None,
+    timing_path=None,
+    options=None,
+    dry_run=False,
+):
+    # Cria o diretório de saída com sufixo '-png-compressed' (não criado com dry_run)
     output_dir = input_dir + "-png-compressed"
-    if not os.path.exists(output_dir):
+    if not dry_run and not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
-    # Listas para armazenar tamanhos dos arquivos
-    original_sizes = []
-    converted_sizes = []
-    compression_rates = []
+    results = []
+    start_timing_log(timing_path)
+    run_timer = StageTimer(timing_path, file=None, method="PNG")
 
-    # Percorre todos os arquivos no diretório de entrada
-    for subdir, _, files in os.walk(input_dir):
-        for file in files:
-            if file.lower().endswith(".dcm"):
-                dicom_path = os.path.join(subdir, file)
-
-                try:
-                    # Carrega o arquivo DICOM
-                    dicom = pydicom.dcmread(dicom_path, force=True)
-
-                    # Extrai os dados de pixel da imagem DICOM
-                    pixel_array = dicom.pixel_array
-
-                    # Normaliza os valores dos pixels para o intervalo 0-255
-                    pixel_array = (pixel_array - np.min(pixel_array)) / (
-                        np.max(pixel_array) - np.min(pixel_array)
-                    )
-                    pixel_array = (pixel_array * 255).astype(np.uint8)
-
-                    # Converte a matriz de pixels em uma imagem Pillow
-                    image = Image.fromarray(pixel_array)
-
-                    # Define o nome do arquivo PNG
-                    png_filename = os.path.splitext(file)[0] + ".png"
-                    png_path = os.path.join(output_dir, png_filename)
-
-                    # Salva a imagem como PNG
-                    image.save(png_path, format="PNG")
-
-                    # Armazena os tamanhos dos arquivos
-                    original_size = os.path.getsize(dicom_path)  # KB
-                    converted_size = os.path.getsize(png_path)  # KB
-                    compression_rate = (1 - converted_size / original_size) * 100
-
-                    original_sizes.append(original_size)
-                    converted_sizes.append(converted_size)
-                    compression_rates.append(compression_rate)
-
-                    update_compression_csv(
-                        f"{subdir.split('/')[-1]}/{file}",
-                        "PNG",
-                        f"{compression_rate:.2f}",
-                        original_size,
-                        converted_size,
-                    )
-
-                except Exception as e:
-                    print(f"Erro ao converter {dicom_path}: {e}")
-
-    # Calcula estatísticas
-    mean_original_size = np.mean(original_sizes)
-    mean_converted_size = np.mean(converted_sizes)
-    mean_compression_rate = np.mean(compression_rates)
-    std_dev_compression_rate = np.std(compression_rates)
-
-    # Exibe os resultados
-    summary = (
-        f"\nTotal de arquivos convertidos: {len(original_sizes)}\n"
-        f"Tamanho médio do arquivo original: {mean_original_size / 1024:.2f} KB\n"
-        f"Tamanho médio do arquivo comprimido: {mean_converted_size / 1024:.2f} KB\n"
-        f"Taxa de compressão média: {mean_compression_rate:.2f}%\n"
-        f"Desvio padrão da taxa de compressão: {std_dev_compression_rate:.2f}"
+    # Manifesto das conversões já realizadas (execuções incrementais)
+    manifest = Manifest(
+        input_dir,
+        output_dir,
+        "PNG",
+        params=options,
+        use_hash=use_hash,
+        force=force,
+        required_fields=("mse", "psnr") if compute_metrics else (),
+        dry_run=dry_run,
     )
-    print(summary)
 
-    # Salva os resultados em um arquivo txt
-    output_txt_path = f"{input_dir}-png-compressed.txt"
-    with open(output_txt_path, "w") as txt_file:
-        txt_file.write(summary)
+    # Percorre todos os arquivos no diretório de entrada
+    with manifest, ResultsWriter() as writer:
+        for result in run_with_manifest(
+            partial(
+                compress_png_file,
+                output_dir=output_dir,
+                compute_metrics=compute_metrics,
+                timing_path=timing_path,
+                options=options,
+                dry_run=dry_run,
+            ),
+            input_dir,
+            workers,
+            manifest,
+            index_path,
+        ):
+            if result is None:
+                continue
+
+            results.append(result)
+            writer.add_result(result)
+
+    # Monta o CSV largo a partir dos resultados acumulados
+    with run_timer.stage("csv_rewrite"):
+        compact_results()
+
+    summarize_results(results, None if dry_run else f"{output_dir}.txt")
+
+    if timing_path:
+        run_timer.write()
+        summarize_timings(timing_path)
 
 
 # Exemplo de uso
 if __name__ == "__main__":
-    import sys
+    parser = argparse.ArgumentParser(
+        description="Converter um diretório de imagens DICOM em arquivos PNG."
+    )
+    parser.add_argument(
+        "input_dir",
+        type=str,
+        help="Caminho para o diretório de imagens DICOM de entrada",
+    )
+    add_workers_argument(parser)
+    add_manifest_arguments(parser)
+    add_index_argument(parser)
+    add_metrics_argument(parser)
+    add_timing_argument(parser)
+    add_dry_run_argument(parser)
+    parser.add_argument(
+        "--sweep",
+        action="store_true",
+        help="Avalia compress_level, optimize e as estratégias do zlib em uma amostra (em memória), salva o relatório com a fronteira de Pareto e encerra",
+    )
+    parser.add_argument(
+        "--sample-size",
+        type=int,
+        default=32,
+        help="Quantidade de arquivos sorteados para a varredura",
+    )
+    parser.add_argument(
+        "--preset",
+        choices=PNG_PRESETS,
+        default=None,
+        help="Converte com um ponto da fronteira de Pareto: archival (menor tamanho) ou fast (codificação mais rápida); faz a varredura antes se o relatório não existir",
+    )
+    parser.add_argument(
+        "--sweep-report",
+        type=str,
+        default=None,
+        help="Relatório da varredura (padrão: <input_dir>-png-sweep.json)",
+    )
+
+    args = parser.parse_args()
+    report_path = args.sweep_report or f"{args.input_dir}-png-sweep.json"
 
-    if len(sys.argv) != 2:
-        print("Uso: python script.py /caminho/para/pasta_de_entrada")
-        sys.exit(1)
+    if args.sweep:
+        sweep_png(args.input_dir, report_path, args.sample_size, args.index)
+        raise SystemExit
 
-    input_dir = sys.argv[1]
+    options = None
+    if args.preset:
+        if not os.path.exists(report_path):
+            sweep_png(args.input_dir, report_path, args.sample_size, args.index)
+        options = load_png_preset(report_path, args.preset)
+        print(f"Preset {args.preset}: {options}")
 
     # Chama a função de conversão
-    convert_dicom_to_png(input_dir)
+    convert_dicom_to_png(
+        args.input_dir,
+        args.workers,
+        args.force,
+        args.hash,
+        args.metrics,
+        args.index,
+        args.timings,
+        options,
+        args.dry_run,
+    )
@@ -0,0 +1,207 @@
+import io
+import os
+import argparse
+from functools import partial
+import numpy as np
+import pydicom
+from pydicom.pixels import iter_pixels
+from pydicom.uid import RLELossless
+from dicom_utils import (
+    add_index_argument,
+    add_metrics_argument,
+    calculate_compression_rate,
+    result_file_name,
+    summarize_results,
+)
+from manifest import Manifest, add_manifest_arguments, run_with_manifest
+from metrics import calculate_psnr
+from parallel import add_workers_argument
+from timing import StageTimer, add_timing_argument, start_timing_log, summarize_timings
+from write_result_csv import ResultsWriter, compact_results
+
+
+def encode_rle(dataset):
+    """
+    Recodifica o PixelData do Dataset em RLE Lossless (sintaxe encapsulada), na
+    profundidade original, e retorna os bytes do arquivo DICOM resultante. O
+    Dataset é alterado no lugar.
+    """
+    # Só datasets descomprimidos podem ser recodificados
+    if dataset.file_meta.TransferSyntaxUID.is_compressed:
+        dataset.decompress()
+    dataset.compress(RLELossless)
+
+    buffer = io.BytesIO()
+    dataset.save_as(buffer)
+    return buffer.getvalue()
+
+
+def decode_rle(data):
+    """Decodifica os bytes de um DICOM RLE Lossless no pixel_array original."""
+    return pydicom.dcmread(io.BytesIO(data)).pixel_array
+
+
+def frame_metrics(dicom_path, data):
+    """
+    MSE e PSNR entre o DICOM original e os bytes do RLE, comparados quadro a quadro
+    (sem montar o volume frames × H × W).
+    """
+    squared_error = 0.0
+    pixels = 0
+    for original, decoded in zip(
+        iter_pixels(dicom_path), iter_pixels(io.BytesIO(data))
+    ):
+        difference = original.astype(np.float64) - decoded
+        squared_error += np.vdot(difference, difference)
+        pixels += difference.size
+
+    mse = round(squared_error / pixels, 2)
+    return {"mse": mse, "psnr": calculate_psnr(mse)}
+
+
+def compress_rle_file(
+    subdir, file, output_dir, compute_metrics=False, timing_path=None
+):
+    """Recodifica um arquivo DICOM em RLE Lossless e retorna o resultado da compressão."""
+    dicom_path = os.path.join(subdir, file)
+    timer = StageTimer(timing_path, file=dicom_path, method="RLE")
+
+    try:
+        # Carrega o arquivo DICOM completo (cabeçalho e pixels)
+        with timer.stage("dcmread"):
+            dataset = pydicom.dcmread(dicom_path, force=True)
+
+        # O arquivo de saída continua sendo um DICOM
+        rle_path = os.path.join(output_dir, file)
+
+        with timer.stage("encode"):
+            data = encode_rle(dataset)
+        with timer.stage("write"):
+            with open(rle_path, "wb") as rle_file:
+                rle_file.write(data)
+
+        # Armazena os tamanhos dos arquivos
+        with timer.stage("getsize"):
+            original_size = os.path.getsize(dicom_path)  # bytes
+            converted_size = os.path.getsize(rle_path)  # bytes
+        timer.add_bytes("input", original_size)
+        timer.add_bytes("output", converted_size)
+
+        result = {
+            "file_name": result_file_name(subdir, file),
+            "method": "RLE",
+            "original_size": original_size,
+            "converted_size": converted_size,
+            "output_path": rle_path,
+            "compression_rate": calculate_compression_rate(
+                original_size, converted_size
+            ),
+        }
+
+        # Decodifica o DICOM em memória e confere os pixels (MSE 0 se sem perdas)
+        if compute_metrics:
+            with timer.stage("metrics"):
+                result.update(frame_metrics(dicom_path, data))
+
+        return result
+
+    except Exception as e:
+        print(f"Erro ao converter {dicom_path}: {e}")
+        return None
+
+    finally:
+        timer.write()
+
+
+def convert_dicom_to_rle(
+    input_dir,
+    workers=1,
+    force=False,
+    use_hash=False,
+    compute_metrics=False,
+    index_path=None,
+    timing_path=None,
+):
+    """
+    Recodifica os arquivos DICOM em RLE Lossless, mantendo o cabeçalho e a
+    profundidade original, em um diretório com sufixo '-rle-compressed'.
+    """
+    output_dir = input_dir + "-rle-compressed"
+    os.makedirs(output_dir, exist_ok=True)
+
+    results = []
+    start_timing_log(timing_path)
+    run_timer = StageTimer(timing_path, file=None, method="RLE")
+
+    # Manifesto das conversões já realizadas (execuções incrementais)
+    manifest = Manifest(
+        input_dir,
+        output_dir,
+        "RLE",
+        use_hash=use_hash,
+        force=force,
+        required_fields=("mse", "psnr") if compute_metrics else (),
+    )
+
+    # Percorre todos os arquivos no diretório de entrada
+    with manifest, ResultsWriter() as writer:
+        for result in run_with_manifest(
+            partial(
+                compress_rle_file,
+                output_dir=output_dir,
+                compute_metrics=compute_metrics,
+                timing_path=timing_path,
+            ),
+            input_dir,
+            workers,
+            manifest,
+            index_path,
+        ):
+            if result is None:
+                continue
+
+            results.append(result)
+            writer.add_result(result)
+
+    # Monta o CSV largo a partir dos resultados acumulados
+    with run_timer.stage("csv_rewrite"):
+        compact_results()
+
+    summarize_results(results, f"{output_dir}.txt")
+
+    if timing_path:
+        run_timer.write()
+        summarize_timings(timing_path)
+
+
+# Exemplo de uso
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Recodificar um diretório de imagens DICOM em RLE Lossless, mantendo arquivos DICOM válidos."
+    )
+    parser.add_argument(
+        "input_dir",
+        type=str,
+        help="Caminho para o diretório de imagens DICOM de entrada",
+    )
+    add_workers_argument(parser)
+    add_manifest_arguments(parser)
+    add_index_argument(parser)
+    add_metrics_argument(
+        parser,
+        "Decodifica cada saída em memória e registra MSE e PSNR (MSE 0 confirma a compressão sem perdas)",
+    )
+    add_timing_argument(parser)
+
+    args = parser.parse_args()
+
+    # Chama a função de conversão
+    convert_dicom_to_rle(
+        args.input_dir,
+        args.workers,
+        args.force,
+        args.hash,
+        args.metrics,
+        args.index,
+        args.timings,
+    )
@@ -0,0 +1,122 @@
+import json
+import os
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+import numpy as np
+
+
+class StageTimer:
+    """
+    Mede a duração de cada estágio do processamento de um arquivo (e os bytes lidos
+    e gravados) e grava um registro JSON por linha em log_path. Sem log_path nada é
+    medido nem gravado, de modo que a instrumentação é opcional.
+    """
+
+    def __init__(self, log_path=None, **fields):
+        self.log_path = log_path
+        self.record = {**fields, "stages": {}, "bytes": {}}
+
+    @contextmanager
+    def stage(self, name):
+        if self.log_path is None:
+            yield
+            return
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            stages = self.record["stages"]
+            stages[name] = stages.get(name, 0.0) + time.perf_counter() - start
+
+    def iter_stage(self, name, iterable):
+        """Percorre iterable medindo cada next() no estágio name (leituras sob demanda)."""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                item = next(iterator, StopIteration)
+            if item is StopIteration:
+                return
+            yield item
+
+    def add_bytes(self, name, count):
+        if self.log_path is not None:
+            self.record["bytes"][name] = self.record["bytes"].get(name, 0) + count
+
+    def write(self):
+        """Anexa o registro ao log (uma linha, segura entre processos do pool)."""
+        if self.log_path is None:
+            return
+        line = json.dumps({**self.record, "pid": os.getpid()}) + "\n"
+        with open(self.log_path, "a", encoding="utf-8") as file:
+            file.write(line)
+
+
+def start_timing_log(log_path):
+    """Recria o log de tempos no início de uma execução."""
+    if log_path is not None:
+        open(log_path, "w").close()
+
+
+def summarize_timings(log_path):
+    """
+    Agrega o log de tempos por estágio (total, média e percentis por arquivo, e
+    participação no tempo total), exibe a tabela e salva o resumo em JSON ao lado
+    do log (extensão .summary.json).
+    """
+    durations = defaultdict(list)
+    byte_counts = defaultdict(int)
+    with open(log_path, "r", encoding="utf-8") as file:
+        for line in file:
+            record = json.loads(line)
+            for stage, seconds in record["stages"].items():
+                durations[stage].append(seconds)
+            for name, count in record["bytes"].items():
+                byte_counts[name] += count
+
+    total_seconds = sum(sum(seconds) for seconds in durations.values())
+    stages = {}
+    for stage, seconds in durations.items():
+        milliseconds = np.array(seconds) * 1000
+        p50, p95 = np.percentile(milliseconds, [50, 95])
+        stages[stage] = {
+            "count": len(seconds),
+            "total_s": float(milliseconds.sum() / 1000),
+            "mean_ms": float(milliseconds.mean()),
+            "p50_ms": float(p50),
+            "p95_ms": float(p95),
+            "max_ms": float(milliseconds.max()),
+            "share": float(milliseconds.sum() / 1000 / total_seconds * 100),
+        }
+
+    summary = {"stages": stages, "bytes": dict(byte_counts)}
+    with open(os.path.splitext(log_path)[0] + ".summary.json", "w") as file:
+        json.dump(summary, file, indent=2)
+
+    # Estágios ordenados pelo tempo total
+    print(f"\nTempo por estágio ({log_path}):")
+    print(
+        f"{'ESTÁGIO':<24} {'N':>6} {'TOTAL (s)':>10} {'MÉDIA (ms)':>11} "
+        f"{'P50 (ms)':>9} {'P95 (ms)':>9} {'%':>6}"
+    )
+    for stage, stats in sorted(stages.items(), key=lambda item: -item[1]["total_s"]):
+        print(
+            f"{stage:<24} {stats['count']:>6} {stats['total_s']:>10.3f} "
+            f"{stats['mean_ms']:>11.3f} {stats['p50_ms']:>9.3f} "
+            f"{stats['p95_ms']:>9.3f} {stats['share']:>6.1f}"
+        )
+    for name, count in byte_counts.items():
+        print(f"Bytes {name}: {count / 1e6:.2f} MB")
+
+    return summary
+
+
+def add_timing_argument(parser):
+    """Adiciona a opção --timings a um ArgumentParser."""
+    parser.add_argument(
+        "--timings",
+        type=str,
+        default=None,
+        help="Grava a duração de cada estágio por arquivo (JSON lines) neste caminho e exibe um resumo por estágio ao final",
+    )
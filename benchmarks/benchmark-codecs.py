@@ -0,0 +1,244 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import numpy as np
+import pydicom
+from dicom_utils import normalize_pixel_array
+from png import encode_png, decode_png
+from jpeg import encode_jpeg, decode_jpeg
+from pca import encode_pca, decode_pca
+from rle import encode_rle, decode_rle
+from synthetic_dicom import generate_fixtures
+
+# Codecs avaliados: nome -> (função de codificação, função de decodificação)
+CODECS = {
+    "PNG": (encode_png, decode_png),
+    "JPEG": (encode_jpeg, decode_jpeg),
+    "PCA-950": (partial(encode_pca, variance_ratio=0.95), decode_pca),
+    "PCA-975": (partial(encode_pca, variance_ratio=0.975), decode_pca),
+    "PCA-990": (partial(encode_pca, variance_ratio=0.99), decode_pca),
+    "PCA-950-ADAPTIVE": (
+        partial(encode_pca, variance_ratio=0.95, svd_solver="adaptive"),
+        decode_pca,
+    ),
+    "PCA-975-ADAPTIVE": (
+        partial(encode_pca, variance_ratio=0.975, svd_solver="adaptive"),
+        decode_pca,
+    ),
+    "PCA-990-ADAPTIVE": (
+        partial(encode_pca, variance_ratio=0.99, svd_solver="adaptive"),
+        decode_pca,
+    ),
+}
+
+# Codecs que recodificam o próprio DICOM na profundidade original: recebem o
+# Dataset em vez da matriz normalizada
+DICOM_CODECS = {
+    "RLE": (encode_rle, decode_rle),
+}
+
+STAGES = ["read", "normalize", "encode", "decode", "total"]
+
+
+def latency_summary(seconds):
+    """Resumo das latências por imagem de um estágio, em milissegundos."""
+    milliseconds = np.array(seconds) * 1000
+    p50, p95, p99 = np.percentile(milliseconds, [50, 95, 99])
+    return {
+        "mean_ms": float(milliseconds.mean()),
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+    }
+
+
+def benchmark_codec(codec, paths, repeat=1, warmup=1):
+    """
+    Mede cada estágio (leitura, normalização, codificação e decodificação) de um
+    codec sobre os arquivos informados. Executado em um processo próprio para que
+    o pico de memória (RSS) seja o do codec.
+    """
+    native = codec in DICOM_CODECS
+    encode, decode = DICOM_CODECS[codec] if native else CODECS[codec]
+    timings = {stage: [] for stage in STAGES}
+    original_bytes = 0
+    encoded_bytes = 0
+
+    # Aquecimento (imports, caches e inicialização das bibliotecas)
+    for path in paths[:warmup]:
+        dataset = pydicom.dcmread(path)
+        decode(
+            encode(dataset if native else normalize_pixel_array(dataset.pixel_array))
+        )
+
+    for _ in range(repeat):
+        for path in paths:
+            start = time.perf_counter()
+            dataset = pydicom.dcmread(path, force=True)
+            pixel_array = dataset.pixel_array
+            read_end = time.perf_counter()
+            if not native:
+                pixel_array = normalize_pixel_array(pixel_array)
+            normalize_end = time.perf_counter()
+            data = encode(dataset if native else pixel_array)
+            encode_end = time.perf_counter()
+            decode(data)
+            decode_end = time.perf_counter()
+
+            timings["read"].append(read_end - start)
+            timings["normalize"].append(normalize_end - read_end)
+            timings["encode"].append(encode_end - normalize_end)
+            timings["decode"].append(decode_end - encode_end)
+            timings["total"].append(decode_end - start)
+            original_bytes += os.path.getsize(path)
+            encoded_bytes += len(data)
+
+    total_seconds = sum(timings["total"])
+    return {
+        "codec": codec,
+        "images": len(timings["total"]),
+        "images_per_s": len(timings["total"]) / total_seconds,
+        "mb_per_s": original_bytes / total_seconds / 1e6,
+        "compression_rate": (1 - encoded_bytes / original_bytes) * 100,
+        "stages": {stage: latency_summary(timings[stage]) for stage in STAGES},
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def environment_info():
+    """Identificação da máquina e da versão do código para comparar resultados."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "pydicom": pydicom.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "git_commit": commit,
+    }
+
+
+def run_benchmarks(args):
+    fixtures_dir = args.fixtures_dir or tempfile.mkdtemp(prefix="dicom-bench-")
+    fixtures = generate_fixtures(
+        fixtures_dir,
+        [(size, size) for size in args.resolutions],
+        args.bits,
+        args.noise,
+        args.images,
+    )
+
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for fixture in fixtures:
+        for codec in args.codecs:
+            # Um processo novo por medição, para isolar o pico de memória
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                result = executor.submit(
+                    benchmark_codec, codec, fixture["paths"], args.repeat
+                ).result()
+
+            result.update(
+                {
+                    key: fixture[key]
+                    for key in ["name", "rows", "columns", "bits_stored", "noise"]
+                }
+            )
+            results.append(result)
+            print(
+                f"{fixture['name']:<28} {codec:<16} "
+                f"{result['images_per_s']:8.1f} img/s "
+                f"{result['mb_per_s']:7.2f} MB/s "
+                f"p95 {result['stages']['total']['p95_ms']:7.2f} ms "
+                f"RSS {result['peak_rss_mb']:7.1f} MB"
+            )
+
+    if not args.fixtures_dir:
+        shutil.rmtree(fixtures_dir)
+
+    report = {"environment": environment_info(), "results": results}
+    with open(args.output, "w") as json_file:
+        json.dump(report, json_file, indent=2)
+    print(f"\nResultados salvos em {args.output}")
+
+
+# Exemplo de uso
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark dos codecs PNG, JPEG, PCA e RLE sobre DICOMs sintéticos."
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default="benchmark-codecs.json",
+        help="Arquivo JSON com os resultados",
+    )
+    parser.add_argument(
+        "--codecs",
+        nargs="+",
+        default=list(CODECS) + list(DICOM_CODECS),
+        choices=list(CODECS) + list(DICOM_CODECS),
+        help="Codecs avaliados",
+    )
+    parser.add_argument(
+        "--resolutions",
+        type=int,
+        nargs="+",
+        default=[256, 512, 1024],
+        help="Resoluções (imagens quadradas) dos DICOMs sintéticos",
+    )
+    parser.add_argument(
+        "--bits",
+        type=int,
+        nargs="+",
+        default=[8, 12, 16],
+        help="Profundidades (BitsStored) dos DICOMs sintéticos",
+    )
+    parser.add_argument(
+        "--noise",
+        type=float,
+        nargs="+",
+        default=[0.0, 0.02, 0.1],
+        help="Desvio do ruído gaussiano (fração da faixa dinâmica)",
+    )
+    parser.add_argument(
+        "--images",
+        type=int,
+        default=16,
+        help="Quantidade de imagens por configuração",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=1,
+        help="Quantidade de repetições sobre as mesmas imagens",
+    )
+    parser.add_argument(
+        "--fixtures-dir",
+        type=str,
+        default=None,
+        help="Diretório onde manter os DICOMs sintéticos (padrão: temporário, removido ao final)",
+    )
+
+    run_benchmarks(parser.parse_args())
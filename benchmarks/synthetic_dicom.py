@@ -0,0 +1,101 @@
+import os
+import numpy as np
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.uid import CTImageStorage, ExplicitVRLittleEndian, generate_uid
+
+
+def synthetic_pixels(rows, columns, bits_stored, noise, seed=0):
+    """
+    Gera um phantom sintético (elipses e gradiente suaves) com ruído gaussiano
+    de desvio noise (fração da faixa dinâmica), na profundidade bits_stored.
+    """
+    rng = np.random.default_rng(seed)
+    max_value = 2**bits_stored - 1
+
+    y, x = np.mgrid[0:rows, 0:columns].astype(np.float32)
+    y = y / rows - 0.5
+    x = x / columns - 0.5
+
+    # Corpo, estruturas internas e gradiente de fundo
+    image = 0.1 + 0.2 * (x + 0.5)
+    image += 0.5 * ((x / 0.45) ** 2 + (y / 0.4) ** 2 < 1)
+    for _ in range(6):
+        cx, cy = rng.uniform(-0.25, 0.25, 2)
+        rx, ry = rng.uniform(0.03, 0.12, 2)
+        image += rng.uniform(-0.2, 0.3) * (
+            ((x - cx) / rx) ** 2 + ((y - cy) / ry) ** 2 < 1
+        )
+
+    image += rng.normal(0, noise, image.shape)
+    image = np.clip(image / 1.2, 0, 1) * max_value
+
+    dtype = np.uint8 if bits_stored <= 8 else np.uint16
+    return image.astype(dtype)
+
+
+def write_synthetic_dicom(path, rows, columns, bits_stored=12, noise=0.02, seed=0):
+    """Grava um DICOM (CT, não comprimido) com pixels sintéticos e retorna o caminho."""
+    pixel_array = synthetic_pixels(rows, columns, bits_stored, noise, seed)
+    bits_allocated = pixel_array.dtype.itemsize * 8
+
+    file_meta = FileMetaDataset()
+    file_meta.MediaStorageSOPClassUID = CTImageStorage
+    file_meta.MediaStorageSOPInstanceUID = generate_uid()
+    file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+
+    dataset = Dataset()
+    dataset.file_meta = file_meta
+    dataset.SOPClassUID = CTImageStorage
+    dataset.SOPInstanceUID = file_meta.MediaStorageSOPInstanceUID
+    dataset.SeriesInstanceUID = generate_uid()
+    dataset.Modality = "CT"
+    dataset.Rows = rows
+    dataset.Columns = columns
+    dataset.SamplesPerPixel = 1
+    dataset.PhotometricInterpretation = "MONOCHROME2"
+    dataset.BitsAllocated = bits_allocated
+    dataset.BitsStored = bits_stored
+    dataset.HighBit = bits_stored - 1
+    dataset.PixelRepresentation = 0
+    dataset.PixelData = pixel_array.tobytes()
+
+    dataset.save_as(path, enforce_file_format=True)
+    return path
+
+
+def generate_fixtures(output_dir, resolutions, bits, noise_levels, images):
+    """
+    Gera images DICOMs sintéticos para cada combinação de resolução, profundidade
+    e nível de ruído, em subdiretórios '<linhas>x<colunas>-<bits>bit-noise<ruído>'.
+    Retorna a lista de configurações com os caminhos gerados.
+    """
+    fixtures = []
+    for rows, columns in resolutions:
+        for bits_stored in bits:
+            for noise in noise_levels:
+                name = f"{columns}x{rows}-{bits_stored}bit-noise{noise}"
+                fixture_dir = os.path.join(output_dir, name)
+                os.makedirs(fixture_dir, exist_ok=True)
+
+                paths = [
+                    write_synthetic_dicom(
+                        os.path.join(fixture_dir, f"synthetic-{i:04d}.dcm"),
+                        rows,
+                        columns,
+                        bits_stored,
+                        noise,
+                        seed=i,
+                    )
+                    for i in range(images)
+                ]
+                fixtures.append(
+                    {
+                        "name": name,
+                        "rows": rows,
+                        "columns": columns,
+                        "bits_stored": bits_stored,
+                        "noise": noise,
+                        "paths": paths,
+                    }
+                )
+    return fixtures
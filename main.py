@@ -1,6 +1,13 @@
+import os
 import subprocess
 import sys
 
+# Os scripts importam módulos de algorithms/, result-analysis/ e pre-processing/
+env = dict(
+    os.environ,
+    PYTHONPATH=os.pathsep.join(["algorithms", "result-analysis", "pre-processing"]),
+)
+
 
 def run_commands_sequentially(commands):
     for command in commands:
@@ -10,7 +17,7 @@ def run_commands_sequentially(commands):
 
             print(f"Executando: {' '.join(command)}")
 
-            result = subprocess.run(command, check=True)
+            result = subprocess.run(command, check=True, env=env)
 
             if result.returncode == 0:
                 print(f"Comando {' '.join(command)} executado com sucesso!\n")
@@ -32,28 +39,10 @@ if __name__ == "__main__":
     path_brain = "/media/nicholas/files/tcc-cancer-images/brain-512x512"
 
     commands = [
-        # PNG compression
-        ["python3", "algorithms/png.py", path_lung],
-        ["python3", "algorithms/png.py", path_breast],
-        ["python3", "algorithms/png.py", path_brain],
-        # JPEG compression
-        ["python3", "algorithms/jpeg.py", path_lung],
-        ["python3", "algorithms/jpeg.py", path_breast],
-        ["python3", "algorithms/jpeg.py", path_brain],
-        # PCA compression - LUNG
-        ["python3", "algorithms/pca.py", path_lung, 0.95],
-        ["python3", "algorithms/pca.py", path_lung, 0.975],
-        ["python3", "algorithms/pca.py", path_lung, 0.99],
-        # PCA compression - BREAST
-        ["python3", "algorithms/pca.py", path_breast, 0.95],
-        ["python3", "algorithms/pca.py", path_breast, 0.975],
-        ["python3", "algorithms/pca.py", path_breast, 0.99],
-        # PCA compression - BRAIN
-        ["python3", "algorithms/pca.py", path_brain, 0.95],
-        ["python3", "algorithms/pca.py", path_brain, 0.975],
-        ["python3", "algorithms/pca.py", path_brain, 0.99],
-        # Calculate MSE and PSNR
-        ["python3", "result-analysis/mse-psnr.py"],
+        # PNG, JPEG e PCA (0.95, 0.975, 0.99) + MSE e PSNR, lendo cada DICOM uma vez
+        ["python3", "algorithms/pipeline.py", path_lung],
+        ["python3", "algorithms/pipeline.py", path_breast],
+        ["python3", "algorithms/pipeline.py", path_brain],
         # Plot graphs
         ["python3", "result-analysis/plot-graphs.py"],
     ]
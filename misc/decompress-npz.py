@@ -1,42 +1,63 @@
-import numpy as np
 import matplotlib.pyplot as plt
 import argparse
+from pca_decoder import decode_pca_batch, decode_pca_region, parse_range
 
 
-def recreate_image_from_pca(npz_path):
-    """Recria e plota a imagem a partir dos dados do arquivo NPZ contendo a imagem comprimida."""
+def recreate_images_from_pca(npz_paths, rows=slice(None), columns=slice(None)):
+    """
+    Recria e plota as imagens (ou só a região rows × columns) a partir dos
+    arquivos NPZ contendo as imagens comprimidas.
+    """
     try:
-        # Carrega os dados do arquivo NPZ
-        data = np.load(npz_path)
-        compressed_image = data["compressed_image"]
-        principal_components = data["principal_components"]
-        mean = data["mean"]
-
-        # Reconstrói a imagem a partir dos componentes principais
-        reconstructed_image = np.dot(compressed_image, principal_components) + mean
-        reconstructed_image = np.clip(reconstructed_image, 0, 255).astype(np.uint8)
-
-        # Plota a imagem reconstruída
-        plt.imshow(reconstructed_image, cmap="gray")
-        plt.title("Imagem Comprimida (Reconstruída)")
-        plt.axis("off")
+        if rows == slice(None) and columns == slice(None):
+            # Imagens inteiras: reconstrói todos os arquivos em lote
+            reconstructed_images = decode_pca_batch(npz_paths)
+        else:
+            # Mapeia cada NPZ em memória e reconstrói apenas a região pedida
+            reconstructed_images = [
+                decode_pca_region(npz_path, rows, columns) for npz_path in npz_paths
+            ]
+
+        # Plota as imagens reconstruídas lado a lado
+        _, axes = plt.subplots(1, len(npz_paths), squeeze=False)
+        for ax, npz_path, reconstructed_image in zip(
+            axes[0], npz_paths, reconstructed_images
+        ):
+            ax.imshow(reconstructed_image, cmap="gray")
+            ax.set_title(
+                npz_path if len(npz_paths) > 1 else "Imagem Comprimida (Reconstruída)"
+            )
+            ax.axis("off")
         plt.show()
 
     except Exception as e:
-        print(f"Erro ao recriar a imagem do arquivo {npz_path}: {e}")
+        print(f"Erro ao recriar as imagens dos arquivos {npz_paths}: {e}")
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
-        description="Recriar e plotar uma imagem comprimida a partir de um arquivo NPZ."
+        description="Recriar e plotar imagens comprimidas a partir de arquivos NPZ."
     )
     parser.add_argument(
-        "npz_path",
+        "npz_paths",
         type=str,
-        help="Caminho para o arquivo NPZ que contém a imagem comprimida",
+        nargs="+",
+        help="Caminhos para os arquivos NPZ que contêm as imagens comprimidas",
+    )
+    parser.add_argument(
+        "--rows",
+        type=parse_range,
+        default=slice(None),
+        help="Faixa de linhas a reconstruir, no formato INÍCIO:FIM (ex.: 256:512)",
+    )
+    parser.add_argument(
+        "--cols",
+        type=parse_range,
+        default=slice(None),
+        help="Faixa de colunas a reconstruir, no formato INÍCIO:FIM",
     )
 
     args = parser.parse_args()
 
-    # Recria e plota a imagem a partir do arquivo NPZ
-    recreate_image_from_pca(args.npz_path)
+    # Recria e plota as imagens a partir dos arquivos NPZ
+    recreate_images_from_pca(args.npz_paths, args.rows, args.cols)
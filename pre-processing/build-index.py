@@ -0,0 +1,28 @@
+import argparse
+from dicom_index import INDEX_PATH, build_index
+
+# Exemplo de uso
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Indexa os cabeçalhos dos arquivos DICOM de um diretório em um banco SQLite."
+    )
+    parser.add_argument(
+        "root_dir",
+        type=str,
+        help="Caminho para o diretório de imagens DICOM",
+    )
+    parser.add_argument(
+        "--organ",
+        type=str,
+        default=None,
+        help="Órgão das imagens (padrão: inferido pelo caminho - lung, breast ou brain)",
+    )
+    parser.add_argument(
+        "--index",
+        type=str,
+        default=INDEX_PATH,
+        help=f"Caminho do índice SQLite (padrão: {INDEX_PATH})",
+    )
+
+    args = parser.parse_args()
+    build_index(args.root_dir, args.organ, args.index)
@@ -1,6 +1,34 @@
 import os
 import shutil
-import pydicom
+import argparse
+from dicom_header import read_dicom_header
+from dicom_index import query_index
+
+
+def copy_indexed_dicom_by_resolution(input_dir, resolution, max_images, index_path):
+    """Copia os DICOMs da resolução desejada consultando o índice (build-index)."""
+    output_dir = input_dir.rstrip(os.sep) + f"-{resolution}"
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Seleciona no índice as imagens 2D grayscale com tipo suportado e a resolução
+    columns, rows = (int(value) for value in resolution.split("x"))
+    matches = query_index(
+        index_path,
+        root_dir=input_dir,
+        rows=rows,
+        columns=columns,
+        dtypes=["uint8", "uint16", "int16", "int8"],
+        single_frame=True,
+        grayscale=True,
+    )
+
+    copied_files = 0
+    for row in matches[:max_images]:
+        shutil.copy(row["path"], output_dir)
+        print(f"Copiado: {row['path']} -> {output_dir}")
+        copied_files += 1
+
+    print(f"\nTotal de arquivos copiados: {copied_files}")
 
 
 def copy_dicom_by_resolution(input_dir, resolution, max_images):
@@ -27,31 +55,27 @@ def copy_dicom_by_resolution(input_dir, resolution, max_images):
                 file_path = os.path.join(subdir, file)
 
                 try:
-                    # Carrega a imagem DICOM
-                    dicom_image = pydicom.dcmread(file_path)
+                    # Lê apenas o cabeçalho DICOM, sem decodificar os pixels
+                    header = read_dicom_header(file_path)
 
                     # Verifica se a imagem possui dados de pixels e se é grayscale 2D
-                    if (
-                        not hasattr(dicom_image, "pixel_array")
-                        or len(dicom_image.pixel_array.shape) != 2
-                    ):
+                    if header["shape"] is None or len(header["shape"]) != 2:
                         continue
 
                     # Verifica se o tipo de dados do pixel array é suportado
-                    if dicom_image.pixel_array.dtype not in [
+                    if header["dtype"] not in [
                         "uint8",
                         "uint16",
                         "int16",
                         "int8",
                     ]:
                         print(
-                            f"Arquivo {file_path} ignorado devido ao tipo de dado não suportado: {dicom_image.pixel_array.dtype}"
+                            f"Arquivo {file_path} ignorado devido ao tipo de dado não suportado: {header['dtype']}"
                         )
                         continue
 
                     # Obtém a resolução da imagem DICOM
-                    pixel_array = dicom_image.pixel_array
-                    rows, columns = pixel_array.shape
+                    rows, columns = header["shape"]
                     dicom_resolution = f"{columns}x{rows}"
 
                     # Verifica se a resolução corresponde à desejada
@@ -73,16 +97,24 @@ def copy_dicom_by_resolution(input_dir, resolution, max_images):
 
 # Exemplo de uso
 if __name__ == "__main__":
-    import sys
-
-    if len(sys.argv) != 4:
-        print(
-            "Uso: python script.py /caminho/para/pasta_de_entrada resolucao_ex:512x512 quantidade_maxima"
+    parser = argparse.ArgumentParser(
+        description="Copia arquivos DICOM de uma resolução para a pasta <entrada>-<resolução>."
+    )
+    parser.add_argument("input_dir", help="Caminho para a pasta de entrada")
+    parser.add_argument("resolution", help="Resolução desejada, ex.: 512x512")
+    parser.add_argument("max_images", type=int, help="Quantidade máxima de imagens")
+    parser.add_argument(
+        "--index",
+        type=str,
+        default=None,
+        help="Índice SQLite (build-index) consultado no lugar de percorrer o diretório",
+    )
+
+    args = parser.parse_args()
+
+    if args.index:
+        copy_indexed_dicom_by_resolution(
+            args.input_dir, args.resolution, args.max_images, args.index
         )
-        sys.exit(1)
-
-    input_dir = sys.argv[1]
-    resolution = sys.argv[2]
-    max_images = int(sys.argv[3])
-
-    copy_dicom_by_resolution(input_dir, resolution, max_images)
+    else:
+        copy_dicom_by_resolution(args.input_dir, args.resolution, args.max_images)
@@ -1,5 +1,5 @@
 import os
-import pydicom
+from dicom_header import read_dicom_header
 from collections import defaultdict
 
 
@@ -22,12 +22,12 @@ def count_dicom_resolutions(root_dir):
                 file_path = os.path.join(subdir, file)
 
                 try:
-                    # Carrega a imagem DICOM
-                    dicom_image = pydicom.dcmread(file_path)
+                    # Lê apenas o cabeçalho DICOM, sem decodificar os pixels
+                    header = read_dicom_header(file_path)
 
                     # Obtém a resolução
-                    rows = dicom_image.Rows
-                    columns = dicom_image.Columns
+                    rows = header["rows"]
+                    columns = header["columns"]
                     resolution = f"{columns}x{rows}"
                     print(f"{i} File: {file_path}, Resolution: {resolution}")
 
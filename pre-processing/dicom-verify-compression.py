@@ -1,6 +1,6 @@
 import sys
 import os
-import pydicom
+from dicom_header import read_dicom_header
 
 
 def check_dicom_compression_in_folder(folder_path):
@@ -15,26 +15,22 @@ def check_dicom_compression_in_folder(folder_path):
 
         # Check if the file is a DICOM image
         if os.path.isfile(file_path) and file_path.lower().endswith(".dcm"):
-            # Load the DICOM image
-            dicom_image = pydicom.dcmread(file_path)
+            # Load only the DICOM header, stopping before the pixel data
+            header = read_dicom_header(file_path)
 
             # Check image dimensions
-            try:
-                rows = dicom_image.Rows
-                columns = dicom_image.Columns
-                print(f"{i} File: {file_name}, Resolution: {columns}x{rows}")
-            except AttributeError:
+            rows = header["rows"]
+            columns = header["columns"]
+            if rows is None or columns is None:
                 print(f"{i} File: {file_name} does not have resolution information.")
                 continue
+            print(f"{i} File: {file_name}, Resolution: {columns}x{rows}")
 
             # Check if compression information is available
-            is_compressed = (
-                dicom_image.file_meta.TransferSyntaxUID
-                and dicom_image.file_meta.TransferSyntaxUID.is_compressed
-            )
-            print(dicom_image.file_meta.TransferSyntaxUID, is_compressed)
+            is_compressed = header["is_compressed"]
+            print(header["transfer_syntax"], is_compressed)
             if is_compressed:
-                uid_compression = dicom_image.file_meta.TransferSyntaxUID
+                uid_compression = header["transfer_syntax"]
                 print(f"{i} File: {file_name}, Compression UID: {uid_compression}")
                 compressed_count += 1
             else:
@@ -0,0 +1,54 @@
+import pydicom
+
+
+def pixel_dtype(bits_allocated, pixel_representation):
+    """Tipo numpy do pixel_array correspondente a BitsAllocated/PixelRepresentation."""
+    if bits_allocated is None:
+        return None
+    if bits_allocated == 1:
+        return "uint8"
+    signed = "int" if pixel_representation == 1 else "uint"
+    return f"{signed}{max(8, bits_allocated)}"
+
+
+def read_dicom_header(file_path):
+    """
+    Lê apenas o cabeçalho de um arquivo DICOM, parando antes do PixelData, e retorna
+    as informações da imagem (dimensões, profundidade, tipo, fotometria e sintaxe).
+    """
+    dicom = pydicom.dcmread(file_path, stop_before_pixels=True)
+
+    rows = dicom.get("Rows")
+    columns = dicom.get("Columns")
+    samples_per_pixel = dicom.get("SamplesPerPixel", 1)
+    number_of_frames = int(dicom.get("NumberOfFrames", 1) or 1)
+
+    # Formato que o pixel_array teria, sem decodificar os pixels
+    shape = None
+    if rows and columns:
+        shape = (rows, columns)
+        if number_of_frames > 1:
+            shape = (number_of_frames,) + shape
+        if samples_per_pixel > 1:
+            shape = shape + (samples_per_pixel,)
+
+    file_meta = getattr(dicom, "file_meta", None)
+    transfer_syntax = file_meta.get("TransferSyntaxUID") if file_meta else None
+
+    return {
+        "rows": rows,
+        "columns": columns,
+        "shape": shape,
+        "number_of_frames": number_of_frames,
+        "samples_per_pixel": samples_per_pixel,
+        "bits_allocated": dicom.get("BitsAllocated"),
+        "bits_stored": dicom.get("BitsStored"),
+        "dtype": pixel_dtype(
+            dicom.get("BitsAllocated"), dicom.get("PixelRepresentation")
+        ),
+        "photometric_interpretation": dicom.get("PhotometricInterpretation"),
+        "transfer_syntax": transfer_syntax,
+        "is_compressed": bool(transfer_syntax and transfer_syntax.is_compressed),
+        "sop_instance_uid": dicom.get("SOPInstanceUID"),
+        "series_instance_uid": dicom.get("SeriesInstanceUID"),
+    }
@@ -0,0 +1,210 @@
+import os
+import sqlite3
+from dicom_header import read_dicom_header
+
+INDEX_PATH = "dicom_index.sqlite"
+ORGANS = ["lung", "breast", "brain"]
+
+COLUMNS = [
+    "path",
+    "organ",
+    "size",
+    "mtime_ns",
+    "rows",
+    "columns",
+    "bits_allocated",
+    "bits_stored",
+    "dtype",
+    "photometric_interpretation",
+    "transfer_syntax",
+    "is_compressed",
+    "number_of_frames",
+    "samples_per_pixel",
+    "sop_instance_uid",
+    "series_instance_uid",
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dicom_files (
+    path TEXT PRIMARY KEY,
+    organ TEXT,
+    size INTEGER,
+    mtime_ns INTEGER,
+    rows INTEGER,
+    columns INTEGER,
+    bits_allocated INTEGER,
+    bits_stored INTEGER,
+    dtype TEXT,
+    photometric_interpretation TEXT,
+    transfer_syntax TEXT,
+    is_compressed INTEGER,
+    number_of_frames INTEGER,
+    samples_per_pixel INTEGER,
+    sop_instance_uid TEXT,
+    series_instance_uid TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_organ_resolution ON dicom_files (organ, rows, columns);
+CREATE INDEX IF NOT EXISTS idx_series ON dicom_files (series_instance_uid);
+CREATE INDEX IF NOT EXISTS idx_sop ON dicom_files (sop_instance_uid);
+"""
+
+
+def connect(index_path=INDEX_PATH):
+    connection = sqlite3.connect(index_path)
+    connection.row_factory = sqlite3.Row
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def infer_organ(path):
+    """Identifica o órgão pelo caminho do arquivo (lung, breast ou brain)."""
+    for organ in ORGANS:
+        if organ in path:
+            return organ
+    return None
+
+
+def build_index(root_dir, organ=None, index_path=INDEX_PATH, batch_size=1000):
+    """
+    Percorre root_dir uma vez e grava uma linha por arquivo DICOM no índice SQLite,
+    lendo apenas o cabeçalho. Arquivos com mesmo tamanho e mtime já indexados são
+    mantidos, e arquivos que não existem mais são removidos.
+    """
+    root_dir = os.path.abspath(root_dir)
+    connection = connect(index_path)
+
+    # Entradas existentes sob root_dir (caminho -> (tamanho, mtime))
+    known = {
+        row["path"]: (row["size"], row["mtime_ns"])
+        for row in connection.execute(
+            "SELECT path, size, mtime_ns FROM dicom_files "
+            "WHERE substr(path, 1, ?) = ?",
+            (len(root_dir) + 1, root_dir + os.sep),
+        )
+    }
+
+    rows = []
+    indexed = unchanged = 0
+    for subdir, _, files in os.walk(root_dir):
+        for file in files:
+            if not file.lower().endswith(".dcm"):
+                continue
+
+            file_path = os.path.join(subdir, file)
+            stat = os.stat(file_path)
+            if known.pop(file_path, None) == (stat.st_size, stat.st_mtime_ns):
+                unchanged += 1
+                continue
+
+            try:
+                header = read_dicom_header(file_path)
+            except Exception as e:
+                print(f"Erro ao processar {file_path}: {e}")
+                continue
+
+            rows.append(
+                {
+                    **header,
+                    "path": file_path,
+                    "organ": organ or infer_organ(file_path),
+                    "size": stat.st_size,
+                    "mtime_ns": stat.st_mtime_ns,
+                }
+            )
+            indexed += 1
+
+            if len(rows) >= batch_size:
+                _insert_rows(connection, rows)
+                rows = []
+
+    _insert_rows(connection, rows)
+
+    # Remove do índice os arquivos que não existem mais
+    connection.executemany(
+        "DELETE FROM dicom_files WHERE path = ?", [(path,) for path in known]
+    )
+    connection.commit()
+    connection.close()
+
+    print(f"Arquivos indexados: {indexed}")
+    print(f"Arquivos sem alteração: {unchanged}")
+    print(f"Arquivos removidos do índice: {len(known)}")
+
+
+def _insert_rows(connection, rows):
+    connection.executemany(
+        f"INSERT OR REPLACE INTO dicom_files ({', '.join(COLUMNS)}) "
+        f"VALUES ({', '.join(':' + column for column in COLUMNS)})",
+        rows,
+    )
+    connection.commit()
+
+
+def query_index(
+    index_path=INDEX_PATH,
+    root_dir=None,
+    organ=None,
+    rows=None,
+    columns=None,
+    dtypes=None,
+    compressed=None,
+    single_frame=None,
+    grayscale=None,
+):
+    """
+    Consulta o índice e retorna as linhas (dicionários) que atendem aos filtros,
+    ordenadas pelo caminho. Ex.: query_index(organ="breast", rows=512,
+    columns=512, compressed=False).
+    """
+    conditions = []
+    parameters = []
+    if root_dir is not None:
+        prefix = os.path.join(os.path.abspath(root_dir), "")
+        conditions.append("substr(path, 1, ?) = ?")
+        parameters.extend([len(prefix), prefix])
+    if organ is not None:
+        conditions.append("organ = ?")
+        parameters.append(organ)
+    if rows is not None:
+        conditions.append("rows = ?")
+        parameters.append(rows)
+    if columns is not None:
+        conditions.append("columns = ?")
+        parameters.append(columns)
+    if dtypes is not None:
+        conditions.append(f"dtype IN ({', '.join('?' for _ in dtypes)})")
+        parameters.extend(dtypes)
+    if compressed is not None:
+        conditions.append("is_compressed = ?")
+        parameters.append(int(compressed))
+    if single_frame is not None:
+        conditions.append("number_of_frames " + ("= 1" if single_frame else "> 1"))
+    if grayscale is not None:
+        conditions.append("samples_per_pixel " + ("= 1" if grayscale else "> 1"))
+
+    sql = "SELECT * FROM dicom_files"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += " ORDER BY path"
+
+    connection = connect(index_path)
+    results = [dict(row) for row in connection.execute(sql, parameters)]
+    connection.close()
+    return results
+
+
+def iter_indexed_files(input_dir, index_path=INDEX_PATH, **filters):
+    """Equivalente a iter_dicom_files, mas consultando o índice em vez do disco."""
+    root_dir = os.path.abspath(input_dir)
+    for row in query_index(index_path, root_dir=input_dir, **filters):
+        relative_path = os.path.relpath(row["path"], root_dir)
+        yield os.path.split(os.path.join(input_dir, relative_path))
+
+
+def organ_by_file_name(index_path=INDEX_PATH):
+    """Mapeia o nome usado no CSV de resultados ('pasta/arquivo.dcm') para o órgão."""
+    organs = {}
+    for row in query_index(index_path):
+        subdir, file = os.path.split(row["path"])
+        organs[f"{os.path.basename(subdir)}/{file}"] = row["organ"]
+    return organs
@@ -0,0 +1,61 @@
+import numpy as np
+
+
+def calculate_mse(original_image, compressed_image):
+    """Calcula o MSE entre duas imagens"""
+    # Converte para float para evitar overflow na subtração de imagens uint8
+    difference = original_image.astype(np.float64) - compressed_image
+    mse = np.mean(difference**2)
+    return round(mse, 2)  # Round to two decimal places
+
+
+def calculate_psnr(mse, max_pixel=255.0):
+    """Calcula o PSNR baseado no MSE"""
+    if mse == 0:
+        return float("inf")  # Retorna infinito se não há diferença
+    psnr = 10 * np.log10((max_pixel**2) / mse)
+    return round(psnr, 2)  # Round to two decimal places
+
+
+def calculate_metrics(original_image, compressed_image):
+    """Calcula MSE e PSNR de uma imagem reconstruída e os retorna em um dicionário."""
+    mse = calculate_mse(original_image, compressed_image)
+    return {"mse": mse, "psnr": calculate_psnr(mse)}
+
+
+def batch_metrics(originals, reconstructions, max_pixel=255.0, chunk_size=32):
+    """
+    Calcula MSE, PSNR e erro absoluto máximo por imagem para pilhas N×H×W de
+    imagens originais e reconstruídas, processando chunk_size imagens por vez
+    para limitar a memória usada pelas diferenças em float64.
+    """
+    originals = np.asarray(originals)
+    reconstructions = np.asarray(reconstructions)
+    if originals.shape != reconstructions.shape or originals.ndim != 3:
+        raise ValueError(
+            f"Pilhas incompatíveis: {originals.shape} e {reconstructions.shape}"
+        )
+
+    count = originals.shape[0]
+    pixels = originals.shape[1] * originals.shape[2]
+    mse = np.empty(count, dtype=np.float64)
+    max_abs_error = np.empty(count, dtype=np.float64)
+
+    for start in range(0, count, chunk_size):
+        end = min(start + chunk_size, count)
+        difference = originals[start:end].astype(np.float64)
+        difference -= reconstructions[start:end]
+
+        max_abs_error[start:end] = np.abs(difference).max(axis=(1, 2))
+        mse[start:end] = np.einsum("ijk,ijk->i", difference, difference) / pixels
+
+    # Arredonda como calculate_mse/calculate_psnr (PSNR infinito quando MSE é 0)
+    mse = np.round(mse, 2)
+    with np.errstate(divide="ignore"):
+        psnr = 10 * np.log10((max_pixel**2) / mse)
+
+    return {
+        "mse": mse,
+        "psnr": np.round(psnr, 2),
+        "max_abs_error": max_abs_error,
+    }
@@ -1,22 +1,14 @@
 import os
+import argparse
+from collections import defaultdict
 import numpy as np
 import pydicom
 from PIL import Image
-from write_result_csv import update_mse_psnr_csv  # Import the CSV update function
-
-
-def calculate_mse(original_image, compressed_image):
-    """Calcula o MSE entre duas imagens"""
-    mse = np.mean((original_image - compressed_image) ** 2)
-    return round(mse, 2)  # Round to two decimal places
-
-
-def calculate_psnr(mse, max_pixel=255.0):
-    """Calcula o PSNR baseado no MSE"""
-    if mse == 0:
-        return float("inf")  # Retorna infinito se não há diferença
-    psnr = 10 * np.log10((max_pixel**2) / mse)
-    return round(psnr, 2)  # Round to two decimal places
+from dicom_utils import add_index_argument
+from metrics import batch_metrics
+from pca_decoder import DecodeCache, decode_pca_batch, decode_pca_region
+from timing import StageTimer, add_timing_argument, start_timing_log, summarize_timings
+from write_result_csv import ResultsWriter, compact_results
 
 
 def normalize_image(image):
@@ -35,78 +27,151 @@ def read_dicom_image(path):
 def read_image(path, is_pca=False):
     """Lê uma imagem comprimida por PCA ou um arquivo PNG/JPEG"""
     if is_pca:
-        data = np.load(path)
-        compressed_image = data["compressed_image"]
-        principal_components = data["principal_components"]
-        mean = data["mean"]
-
-        # Reconstroi a imagem usando os componentes principais
-        reconstructed_image = np.dot(compressed_image, principal_components) + mean
-
-        # Clampeia os valores da imagem reconstruída para garantir que estejam dentro da faixa [0, 255]
-        reconstructed_image = np.clip(reconstructed_image, 0, 255).astype(np.uint8)
-
-        return reconstructed_image
+        # NPZ mapeado em memória (por linhas, por blocos ou com base compartilhada)
+        # ou .pcaz
+        return decode_pca_region(path)
     else:
         return np.array(Image.open(path).convert("L"), dtype=np.uint8)
 
 
-def process_images(original_directory, compressed_directories, compressed_extensions):
-    """Processa as imagens originais e comprimidas, calculando o MSE e PSNR para cada método"""
-    results = []
+def method_display_name(method):
+    """Nome do método usado nas colunas do CSV (PNG, JPEG, PCA-950...)"""
+    pca_method_mapping = {
+        "pca95": "PCA-950",
+        "pca975": "PCA-975",
+        "pca99": "PCA-990",
+    }
 
-    for file in os.listdir(original_directory):
-        if not file.endswith(".dcm"):
-            continue
+    if method.startswith("pca"):
+        return pca_method_mapping.get(method, f"PCA-{method[3:]}")
+    return method.upper()
 
-        original_image = read_dicom_image(os.path.join(original_directory, file))
 
-        for method, directory in compressed_directories.items():
-            compressed_file = os.path.splitext(file)[0] + compressed_extensions[method]
-            compressed_path = os.path.join(directory, compressed_file)
+def list_original_files(original_directory, index_path=None):
+    """Lista os DICOMs do diretório, consultando o índice (build-index) se informado"""
+    if index_path:
+        from dicom_index import query_index
 
-            if not os.path.exists(compressed_path):
-                print(f"File not found: {compressed_path}")
-                continue
+        return [
+            os.path.basename(row["path"])
+            for row in query_index(index_path, root_dir=original_directory)
+            if os.path.dirname(row["path"]) == os.path.abspath(original_directory)
+        ]
 
-            compressed_image = read_image(
-                compressed_path, is_pca=(method.startswith("pca"))
-            )
-            if compressed_image.shape != original_image.shape:
-                print(f"Size mismatch for {file} in method {method}")
-                continue
+    return sorted(
+        file for file in os.listdir(original_directory) if file.endswith(".dcm")
+    )
 
-            # Calcula o MSE
-            mse = calculate_mse(original_image, compressed_image)
 
-            # Calcula o PSNR com base no MSE
-            psnr = calculate_psnr(mse)
+def process_images(
+    original_directory,
+    compressed_directories,
+    compressed_extensions,
+    chunk_size=64,
+    index_path=None,
+    timing_path=None,
+    decode_cache=None,
+):
+    """
+    Processa as imagens originais e comprimidas em blocos de chunk_size arquivos,
+    calculando MSE, PSNR e erro absoluto máximo de cada método de forma vetorizada.
+    As imagens PCA do bloco são reconstruídas em lote (e guardadas em decode_cache)
+    """
+    results = []
+    files = list_original_files(original_directory, index_path)
+
+    for start in range(0, len(files), chunk_size):
+        # Lê cada original uma única vez por bloco
+        originals = {}
+        timers = {}
+        for file in files[start : start + chunk_size]:
+            original_path = os.path.join(original_directory, file)
+            timers[file] = StageTimer(timing_path, file=original_path)
+            with timers[file].stage("read_original"):
+                originals[file] = read_dicom_image(original_path)
+        chunk_timer = StageTimer(timing_path, file=None, files=len(originals))
 
-            # Build the method name
-            pca_method_mapping = {
-                "pca95": "PCA-950",
-                "pca975": "PCA-975",
-                "pca99": "PCA-990",
-            }
+        for method, directory in compressed_directories.items():
+            # Agrupa as imagens pelo formato para empilhá-las em N×H×W
+            groups = defaultdict(list)
+            compressed_paths = {}
+            for file in originals:
+                compressed_file = (
+                    os.path.splitext(file)[0] + compressed_extensions[method]
+                )
+                compressed_path = os.path.join(directory, compressed_file)
+
+                if not os.path.exists(compressed_path):
+                    print(f"File not found: {compressed_path}")
+                    continue
+                compressed_paths[file] = compressed_path
 
             if method.startswith("pca"):
-                method_name = pca_method_mapping.get(method, f"PCA-{method[3:]}")
+                # Reconstrói todas as imagens PCA do bloco em lote
+                with chunk_timer.stage(f"{method}:batch_decode"):
+                    compressed_images = dict(
+                        zip(
+                            compressed_paths,
+                            decode_pca_batch(
+                                list(compressed_paths.values()), decode_cache
+                            ),
+                        )
+                    )
             else:
-                method_name = method.upper()
-
-            # Collect the result
-            results.append(
-                {
-                    "original_file_name": f"{os.path.basename(original_directory)}/{file}",
-                    "compression_method": method_name,
-                    "mse_value": mse,
-                    "psnr_value": psnr,  # Adiciona o PSNR junto com o MSE
-                }
-            )
+                compressed_images = {}
+                for file, compressed_path in compressed_paths.items():
+                    with timers[file].stage(f"{method}:read"):
+                        compressed_images[file] = read_image(compressed_path)
+
+            for file, compressed_image in compressed_images.items():
+                original_image = originals[file]
+                if compressed_image.shape != original_image.shape:
+                    print(f"Size mismatch for {file} in method {method}")
+                    continue
+
+                groups[original_image.shape].append((file, compressed_image))
+
+            for pairs in groups.values():
+                # Calcula MSE, PSNR e erro máximo de todo o grupo de uma vez
+                with chunk_timer.stage(f"{method}:batch_metrics"):
+                    metrics = batch_metrics(
+                        np.stack([originals[file] for file, _ in pairs]),
+                        np.stack([compressed_image for _, compressed_image in pairs]),
+                    )
+
+                # Collect the results
+                for i, (file, _) in enumerate(pairs):
+                    results.append(
+                        {
+                            "original_file_name": f"{os.path.basename(original_directory)}/{file}",
+                            "compression_method": method_display_name(method),
+                            "mse_value": metrics["mse"][i],
+                            "psnr_value": metrics["psnr"][i],
+                            "max_abs_error": metrics["max_abs_error"][i],
+                        }
+                    )
+
+        for timer in timers.values():
+            timer.write()
+        chunk_timer.write()
 
     return results
 
 
+parser = argparse.ArgumentParser(
+    description="Calcula MSE e PSNR das imagens comprimidas em relação às originais."
+)
+add_index_argument(parser)
+parser.add_argument(
+    "--cache-mb",
+    type=int,
+    default=512,
+    help="Memória máxima (MB) do cache de imagens PCA reconstruídas",
+)
+add_timing_argument(parser)
+args = parser.parse_args()
+decode_cache = DecodeCache(args.cache_mb * 2**20)
+
 # Directories of the original and compressed images
 original_directories = {
     "lung": "/media/nicholas/files/tcc-cancer-images/lung-512x512",
@@ -131,6 +196,8 @@ compressed_extensions = {
 }
 
 all_results = []
+start_timing_log(args.timings)
+run_timer = StageTimer(args.timings, file=None)
 
 # Process images for each category
 for category in original_directories:
@@ -140,9 +207,28 @@ for category in original_directories:
         for method in compressed_directories_base
     }
     category_results = process_images(
-        original_directories[category], compressed_directories, compressed_extensions
+        original_directories[category],
+        compressed_directories,
+        compressed_extensions,
+        index_path=args.index,
+        timing_path=args.timings,
+        decode_cache=decode_cache,
     )
     all_results.extend(category_results)
 
 # Atualiza o CSV com os resultados (incluindo MSE e PSNR)
-update_mse_psnr_csv(all_results)
+with run_timer.stage("csv_rewrite"):
+    with ResultsWriter() as writer:
+        for result in all_results:
+            writer.add_mse_psnr(
+                result["original_file_name"],
+                result["compression_method"],
+                result["mse_value"],
+                result["psnr_value"],
+                result["max_abs_error"],
+            )
+    compact_results()
+
+if args.timings:
+    run_timer.write()
+    summarize_timings(args.timings)
@@ -3,17 +3,34 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import os
+import argparse
 
 # Criar diretório para salvar os gráficos
 os.makedirs("./graphs", exist_ok=True)
 
 
 # Função para carregar e preparar os dados
-def load_and_prepare_data(file_path):
+def load_and_prepare_data(file_path, index_path=None):
     new_data = pd.read_csv(file_path)
-    new_data["TIPO DE IMAGEM"] = new_data["NOME DO ARQUIVO"].apply(
-        lambda x: "Cérebro" if "brain" in x else "Mama" if "breast" in x else "Pulmão"
-    )
+    if index_path:
+        # Obtém o órgão de cada arquivo pelo índice (build-index)
+        from dicom_index import organ_by_file_name
+
+        organ_labels = {"brain": "Cérebro", "breast": "Mama", "lung": "Pulmão"}
+        organs = organ_by_file_name(index_path)
+        # Quadros de objetos multiframe ('arquivo.dcm#f0001') usam o arquivo de origem
+        source_files = new_data["NOME DO ARQUIVO"].str.replace(
+            r"#f\d{4}$", "", regex=True
+        )
+        new_data["TIPO DE IMAGEM"] = source_files.map(
+            lambda x: organ_labels.get(organs.get(x), "Pulmão")
+        )
+    else:
+        new_data["TIPO DE IMAGEM"] = new_data["NOME DO ARQUIVO"].apply(
+            lambda x: (
+                "Cérebro" if "brain" in x else "Mama" if "breast" in x else "Pulmão"
+            )
+        )
     new_data.replace([np.inf, -np.inf], np.nan, inplace=True)
     average_metrics = (
         new_data.groupby("TIPO DE IMAGEM")
@@ -210,11 +227,20 @@ def plot_psnr_comparison(
     plt.close()
 
 
+parser = argparse.ArgumentParser(description="Gera os gráficos de compressão e PSNR.")
+parser.add_argument(
+    "--index",
+    type=str,
+    default=None,
+    help="Índice SQLite (build-index) usado para identificar o órgão de cada arquivo",
+)
+args = parser.parse_args()
+
 # Caminho do arquivo CSV
 new_file_path = "compression_data.csv"
 
 # Carregar e preparar os dados
-average_metrics = load_and_prepare_data(new_file_path)
+average_metrics = load_and_prepare_data(new_file_path, args.index)
 
 # Definindo métodos de compressão e cores
 compression_methods = [
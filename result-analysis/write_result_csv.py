@@ -1,165 +1,186 @@
 import csv
+import fcntl
 import os
-import sys
-import pandas as pd
-
-
-# Função para atualizar ou adicionar uma linha no CSV com a taxa de compressão específica
-def update_compression_csv(
-    original_file_name,
-    compression_method,
-    compression_rate,
-    original_size,
-    compressed_size,
-):
-    csv_path = "compression_data.csv"
-    # Cria um dicionário para armazenar as linhas do CSV
-    rows = []
-    file_exists = os.path.exists(csv_path)
-    found = False
-
-    # Converte os tamanhos para KB com duas casas decimais
-    original_size_kb = f"{round(original_size / 1000, 2):.2f}"
-    compressed_size_kb = f"{round(compressed_size / 1000, 2):.2f}"
-
-    # Converte a taxa de compressão para duas casas decimais
-    compression_rate = round(float(compression_rate), 2)
-
-    # Define o nome da coluna de taxa de compressão
-    compression_rate_column = f"COMPRESSAO {compression_method}"
-    compressed_size_column = f"{compression_method} - TAMANHO COMPRIMIDO (KB)"
-
-    # Se o arquivo já existir, lê as linhas para atualizar
-    if file_exists:
-        with open(csv_path, mode="r", newline="") as file:
-            reader = csv.DictReader(file)
-            headers = reader.fieldnames
-            rows = list(reader)
-
-            # Verifica se o arquivo original já está listado
-            for row in rows:
-                if row["NOME DO ARQUIVO"] == original_file_name:
-                    # Atualiza apenas as colunas do método de compressão atual
-                    if (
-                        "TAMANHO ORIGINAL (KB)" not in row
-                        or not row["TAMANHO ORIGINAL (KB)"]
-                    ):
-                        row["TAMANHO ORIGINAL (KB)"] = original_size_kb
-                    row[compressed_size_column] = compressed_size_kb
-                    row[compression_rate_column] = compression_rate
-                    found = True
-                    break
-
-    # Define a ordem das colunas, garantindo que "TAMANHO ORIGINAL (KB)" esteja antes das colunas de compressão
-    headers = headers if file_exists else ["NOME DO ARQUIVO", "TAMANHO ORIGINAL (KB)"]
-    if compressed_size_column not in headers:
-        headers.append(compressed_size_column)
-    if compression_rate_column not in headers:
-        headers.append(compression_rate_column)
-
-    # Reorganiza as colunas para garantir que "TAMANHO ORIGINAL (KB)" esteja sempre antes
-    headers = ["NOME DO ARQUIVO", "TAMANHO ORIGINAL (KB)"] + [
-        h for h in headers if h not in ["NOME DO ARQUIVO", "TAMANHO ORIGINAL (KB)"]
-    ]
-
-    # Escreve os dados de volta no CSV
-    with open(csv_path, mode="w", newline="") as file:
-        writer = csv.DictWriter(file, fieldnames=headers)
-        writer.writeheader()
-        for row in rows:
-            writer.writerow(row)
-        if not found:
-            # Apenas adiciona a nova linha se ela não existir
-            new_row = {
-                "NOME DO ARQUIVO": original_file_name,
-                "TAMANHO ORIGINAL (KB)": original_size_kb,
-                compressed_size_column: compressed_size_kb,
-                compression_rate_column: compression_rate,
-            }
-            rows.append(new_row)
-            writer.writerow(new_row)
-
-
-def update_mse_csv2(original_file_name, compression_method, mse_value):
-    csv_path = "compression_data.csv"
-
-    # Nome da coluna de MSE
-    mse_column = f"{compression_method} - MSE"
-
-    temp_file_path = "temp_compression_data.csv"  # Arquivo temporário para a escrita
-    updated = False  # Flag para verificar se a linha foi modificada
-
-    # Abrir o CSV para leitura e escrita apenas na linha correta
-    with open(csv_path, mode="r", newline="", encoding="utf-8") as infile, open(
-        temp_file_path, mode="w", newline="", encoding="utf-8"
-    ) as outfile:
-        reader = csv.DictReader(infile)
-        headers = reader.fieldnames
-
-        # Verifica se a coluna de MSE já existe, senão, adiciona
-        if mse_column not in headers:
-            headers.append(mse_column)
-
-        writer = csv.DictWriter(outfile, fieldnames=headers)
-        writer.writeheader()
-
-        for row in reader:
-            # Atualiza apenas a linha correspondente
-            if row["NOME DO ARQUIVO"] == original_file_name:
-                row[mse_column] = f"{mse_value:.2f}"
-                updated = True
-
-            # Escreve a linha (atualizada ou não) no arquivo temporário
-            writer.writerow(row)
-
-    # Substitui o arquivo original pelo temporário
-    if updated:
-        os.replace(temp_file_path, csv_path)
-    else:
-        os.remove(temp_file_path)
-
-
-def update_mse_psnr_csv(updates):
-    csv_path = "compression_data.csv"
-
-    # Carrega o CSV como um DataFrame do Pandas
-    df = pd.read_csv(csv_path)
-
-    # Aplica todas as atualizações em memória
-    for update in updates:
-        original_file_name = update["original_file_name"]
-        compression_method = update["compression_method"]
-        mse_value = update["mse_value"]
-        psnr_value = update.get("psnr_value")  # Obtem o PSNR
-
-        mse_column = f"MSE {compression_method}"
-        psnr_column = f"PSNR {compression_method}"
-
-        # Verifica se as colunas MSE e PSNR já existem, senão as adiciona com valores nulos
-        if mse_column not in df.columns:
-            df[mse_column] = pd.NA
-        if psnr_column not in df.columns:
-            df[psnr_column] = pd.NA
-
-        # Atualiza a célula correspondente com um valor numérico
+from contextlib import contextmanager
+
+CSV_PATH = "compression_data.csv"
+LOG_PATH = "compression_data_log.csv"
+LOG_HEADERS = ["NOME DO ARQUIVO", "COLUNA", "VALOR"]
+
+
+@contextmanager
+def log_lock(log_path=LOG_PATH):
+    """
+    Trava exclusiva (flock) sobre o log, compartilhada por todos os processos que
+    anexam linhas a ele ou o compactam, de modo que conversões simultâneas não
+    percam linhas.
+    """
+    with open(log_path + ".lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
         try:
-            df.loc[df["NOME DO ARQUIVO"] == original_file_name, mse_column] = float(
-                mse_value
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class ResultsWriter:
+    """
+    Acumula os resultados em memória e os anexa em lotes a um log CSV no formato
+    longo (arquivo, coluna, valor). O CSV largo é montado por compact_results.
+    """
+
+    def __init__(self, log_path=LOG_PATH, batch_size=1000):
+        self.log_path = log_path
+        self.batch_size = batch_size
+        self.rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+
+    def add(self, original_file_name, column, value):
+        self.rows.append((original_file_name, column, value))
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def add_compression(
+        self,
+        original_file_name,
+        compression_method,
+        compression_rate,
+        original_size,
+        compressed_size,
+    ):
+        # Converte os tamanhos para KB e a taxa de compressão para duas casas decimais
+        self.add(
+            original_file_name,
+            "TAMANHO ORIGINAL (KB)",
+            f"{round(original_size / 1000, 2):.2f}",
+        )
+        self.add(
+            original_file_name,
+            f"{compression_method} - TAMANHO COMPRIMIDO (KB)",
+            f"{round(compressed_size / 1000, 2):.2f}",
+        )
+        self.add(
+            original_file_name,
+            f"COMPRESSAO {compression_method}",
+            round(float(compression_rate), 2),
+        )
+
+    def add_mse_psnr(
+        self, original_file_name, compression_method, mse, psnr, max_abs_error=None
+    ):
+        self.add(original_file_name, f"MSE {compression_method}", float(mse))
+        if psnr is not None:
+            self.add(original_file_name, f"PSNR {compression_method}", float(psnr))
+        if max_abs_error is not None:
+            self.add(
+                original_file_name,
+                f"ERRO MAXIMO {compression_method}",
+                float(max_abs_error),
+            )
+
+    def add_result(self, result):
+        """Registra o resultado de um arquivo retornado pelos algoritmos de compressão."""
+        self.add_compression(
+            result["file_name"],
+            result["method"],
+            result["compression_rate"],
+            result["original_size"],
+            result["converted_size"],
+        )
+        if "jpeg_quality" in result:
+            # Qualidade escolhida pelo controle de taxa (jpeg.py --target-psnr)
+            self.add(
+                result["file_name"],
+                f"QUALIDADE {result['method']}",
+                result["jpeg_quality"],
+            )
+        if "predicted_mse" in result:
+            # Erro previsto pelos valores singulares descartados (pca.py)
+            self.add(
+                result["file_name"],
+                f"MSE PREVISTO {result['method']}",
+                float(result["predicted_mse"]),
+            )
+            self.add(
+                result["file_name"],
+                f"PSNR PREVISTO {result['method']}",
+                float(result["predicted_psnr"]),
             )
-            if psnr_value is not None:  # Certifique-se de que o PSNR foi fornecido
-                df.loc[df["NOME DO ARQUIVO"] == original_file_name, psnr_column] = (
-                    float(psnr_value)
-                )
-        except ValueError:
-            print(
-                f"Error converting {mse_value} or {psnr_value} to float for {original_file_name} and method {compression_method}"
+        if "mse" in result:
+            self.add_mse_psnr(
+                result["file_name"],
+                result["method"],
+                result["mse"],
+                result["psnr"],
+                result.get("max_abs_error"),
             )
-            continue
 
-    # Escreve de volta no arquivo CSV
-    df.to_csv(csv_path, index=False, encoding="utf-8")
+    def flush(self):
+        """Anexa as linhas acumuladas ao final do log."""
+        if not self.rows:
+            return
+
+        with log_lock(self.log_path):
+            write_header = not os.path.exists(self.log_path)
+            with open(self.log_path, mode="a", newline="", encoding="utf-8") as file:
+                writer = csv.writer(file)
+                if write_header:
+                    writer.writerow(LOG_HEADERS)
+                writer.writerows(self.rows)
+        self.rows = []
+
+
+def compact_results(log_path=LOG_PATH, csv_path=CSV_PATH):
+    """
+    Aplica o log de resultados ao CSV largo (uma linha por arquivo, uma coluna por
+    métrica e método), reescrevendo-o uma única vez, e remove o log. A trava do log
+    impede que outra conversão anexe linhas entre a leitura e a remoção.
+    """
+    with log_lock(log_path):
+        if os.path.exists(log_path):
+            apply_log(log_path, csv_path)
+
+
+def apply_log(log_path, csv_path):
+    """Aplica o log ao CSV largo e remove o log (chamada com a trava do log)."""
+    rows = {}
+    headers = ["NOME DO ARQUIVO", "TAMANHO ORIGINAL (KB)"]
+
+    # Carrega o CSV existente, se houver
+    if os.path.exists(csv_path):
+        with open(csv_path, mode="r", newline="", encoding="utf-8") as file:
+            reader = csv.DictReader(file)
+            headers += [h for h in reader.fieldnames if h not in headers]
+            for row in reader:
+                rows[row["NOME DO ARQUIVO"]] = row
+
+    # Aplica as linhas do log em ordem; o valor mais recente prevalece
+    with open(log_path, mode="r", newline="", encoding="utf-8") as file:
+        reader = csv.reader(file)
+        next(reader, None)  # Cabeçalho
+        for original_file_name, column, value in reader:
+            if column not in headers:
+                headers.append(column)
+            row = rows.setdefault(
+                original_file_name, {"NOME DO ARQUIVO": original_file_name}
+            )
+            row[column] = value
+
+    # Escreve em um arquivo temporário e substitui o CSV
+    temp_file_path = csv_path + ".tmp"
+    with open(temp_file_path, mode="w", newline="", encoding="utf-8") as file:
+        writer = csv.DictWriter(file, fieldnames=headers)
+        writer.writeheader()
+        writer.writerows(rows.values())
+    os.replace(temp_file_path, csv_path)
+    os.remove(log_path)
 
 
-# Torna a função utilizável em outros arquivos ao definir o módulo principal
+# Compacta um log pendente (por exemplo, de uma execução interrompida)
 if __name__ == "__main__":
-    print()
+    compact_results()
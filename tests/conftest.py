@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Os scripts importam os módulos uns dos outros pelo PYTHONPATH (como em main.py)
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for directory in ("algorithms", "result-analysis", "pre-processing"):
+    sys.path.insert(0, os.path.join(ROOT, directory))
@@ -0,0 +1,56 @@
+from manifest import Manifest
+
+
+def make_result(tmp_path, name):
+    output_path = tmp_path / "out" / name
+    output_path.parent.mkdir(exist_ok=True)
+    output_path.write_bytes(b"x")
+    return {
+        "file_name": f"a/{name}",
+        "method": "PNG",
+        "original_size": 100,
+        "converted_size": 1,
+        "output_path": str(output_path),
+        "compression_rate": 99.0,
+        "mse": 0.0,
+        "psnr": float("inf"),
+    }
+
+
+def test_lookup_single_frame(tmp_path):
+    dicom_path = tmp_path / "in" / "img.dcm"
+    dicom_path.parent.mkdir()
+    dicom_path.write_bytes(b"dicom")
+    result = make_result(tmp_path, "img.png")
+
+    with Manifest(tmp_path / "in", tmp_path / "out", "PNG") as manifest:
+        manifest.record(str(dicom_path), result)
+
+    manifest = Manifest(
+        tmp_path / "in", tmp_path / "out", "PNG", required_fields=("mse", "psnr")
+    )
+    assert manifest.lookup(str(dicom_path)) == result
+
+
+def test_lookup_multi_frame_with_required_fields(tmp_path):
+    dicom_path = tmp_path / "in" / "cine.dcm"
+    dicom_path.parent.mkdir()
+    dicom_path.write_bytes(b"dicom")
+    results = [make_result(tmp_path, f"cine_f{frame:04d}.png") for frame in range(1, 4)]
+
+    with Manifest(tmp_path / "in", tmp_path / "out", "PNG") as manifest:
+        manifest.record(str(dicom_path), results)
+
+    manifest = Manifest(
+        tmp_path / "in", tmp_path / "out", "PNG", required_fields=("mse", "psnr")
+    )
+    assert manifest.lookup(str(dicom_path)) == results
+
+    # Um quadro sem MSE torna a entrada desatualizada
+    del results[1]["mse"]
+    with Manifest(tmp_path / "in", tmp_path / "out", "PNG") as manifest:
+        manifest.record(str(dicom_path), results)
+    manifest = Manifest(
+        tmp_path / "in", tmp_path / "out", "PNG", required_fields=("mse", "psnr")
+    )
+    assert manifest.lookup(str(dicom_path)) is None
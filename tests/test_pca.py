@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+from metrics import calculate_metrics
+from pca import decode_pca, encode_pca, psnr_variance_ratio
+
+
+def synthetic_image(size=256, seed=0):
+    """Imagem uint8 suave (gradientes e manchas) com ruído, como uma fatia de TC."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:size, 0:size] / size
+    image = 80 + 60 * np.sin(3 * x) * np.cos(2 * y)
+    for _ in range(8):
+        cy, cx, radius = rng.uniform(0, 1, 3)
+        image += 60 * np.exp(-((x - cx) ** 2 + (y - cy) ** 2) / (0.02 + radius * 0.05))
+    image += rng.normal(0, 4, image.shape)
+    return np.clip(image, 0, 255).astype(np.uint8)
+
+
+@pytest.mark.parametrize("target_psnr", [30.0, 35.0, 40.0, 45.0])
+def test_target_psnr_is_reached(target_psnr):
+    pixel_array = synthetic_image()
+    variance_ratio = psnr_variance_ratio(pixel_array.astype(np.float32), target_psnr)
+    reconstructed = decode_pca(encode_pca(pixel_array, variance_ratio))
+    assert calculate_metrics(pixel_array, reconstructed)["psnr"] >= target_psnr